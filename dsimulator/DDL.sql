@@ -14,8 +14,6 @@ CREATE TABLE edge(
 	            FOREIGN KEY(end)   REFERENCES vertex(vertex_id)
 );
 
-CREATE INDEX idx_edge ON edge(start, end);
-
 CREATE TABLE building(
 	building_id   INTEGER NOT NULL,
 	building_name TEXT NOT NULL,
@@ -49,6 +47,8 @@ CREATE TABLE occupation(
 	                PRIMARY KEY(occupation_id)
 );
 
+CREATE INDEX idx_occupation_income ON occupation(income);
+
 CREATE TABLE workplace(
 	workplace_id          INTEGER NOT NULL,
 	workplace_building_id INTEGER NOT NULL,
@@ -59,6 +59,8 @@ CREATE TABLE workplace(
 	                      FOREIGN KEY(occupation_id)         REFERENCES occupation(occupation_id)
 );
 
+CREATE INDEX idx_workplace_occupation ON workplace(occupation_id);
+
 CREATE TABLE inhabitant(
 	inhabitant_id    INTEGER NOT NULL,
 	first_name       TEXT    NOT NULL,
@@ -75,6 +77,9 @@ CREATE TABLE inhabitant(
 	                 FOREIGN KEY(workplace_id)     REFERENCES workplace(workplace_id)
 );
 
+CREATE INDEX idx_inhabitant_home ON inhabitant(home_building_id);
+CREATE INDEX idx_inhabitant_workplace ON inhabitant(workplace_id);
+
 CREATE TABLE relationship(
 	subject_id  INTEGER NOT NULL,
 	object_id   INTEGER NOT NULL,
@@ -95,8 +100,10 @@ CREATE TABLE victim(
 );
 
 CREATE TABLE killer(
-	killer_id INTEGER NOT NULL,
-	          PRIMARY KEY(killer_id)
+	killer_id            INTEGER NOT NULL,
+	killer_inhabitant_id INTEGER NOT NULL UNIQUE,
+	                     PRIMARY KEY(killer_id)
+	                     FOREIGN KEY(killer_inhabitant_id) REFERENCES inhabitant(inhabitant_id)
 );
 
 CREATE TABLE killer_chara(
@@ -112,13 +119,11 @@ CREATE TABLE suspect(
 	              FOREIGN KEY(inhabitant_id) REFERENCES inhabitant(inhabitant_id)
 );
 
+CREATE INDEX idx_suspect ON suspect(inhabitant_id);
+
 CREATE TABLE status(
-	single               INTEGER DEFAULT 0 NOT NULL CHECK(single = 0),
-	day                  INTEGER DEFAULT 1 NOT NULL,
-	resignation_day      INTEGER NOT NULL,
-	killer_id            INTEGER NOT NULL,
-	killer_inhabitant_id INTEGER NOT NULL,
-	                     PRIMARY KEY(single),
-	                     FOREIGN KEY(killer_id)            REFERENCES killer(killer_id)
-	                     FOREIGN KEY(killer_inhabitant_id) REFERENCES inhabitant(inhabitant_id)
+	single          INTEGER DEFAULT 0 NOT NULL CHECK(single = 0),
+	day             INTEGER DEFAULT 1 NOT NULL,
+	resignation_day INTEGER NOT NULL,
+	                PRIMARY KEY(single)
 ) WITHOUT ROWID;
@@ -4,6 +4,7 @@ import sys
 import os
 import dearpygui.dearpygui as dpg
 from dsimulator.defs import MAIN_WIDTH, MAIN_HEIGHT, RES_DIR
+import dsimulator.game as game
 
 # For handling segfaults such as those coming from DearPyGui.
 import faulthandler
@@ -45,8 +46,12 @@ def main() -> int:
         dpg.render_dearpygui_frame()
 
     dpg.destroy_context()
+    # Stop computing the next day in advance, if the window was closed while playing.
+    game.set_speculation(False)
 
     return 0
 
 
-sys.exit(main())
+# The guard keeps the worker processes started by the game, which import the main module, from opening the window.
+if __name__ == '__main__':
+    sys.exit(main())
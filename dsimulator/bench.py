@@ -0,0 +1,119 @@
+"""
+Run the game headlessly and report how long each phase of a turn takes, as JSON.
+
+Usage:
+    python -m dsimulator.bench --size 10x10 30x30 --inhabitants 1000 --killers 1 4 --days 5 --seed 0 1
+
+One run is made for every combination of map size, number of inhabitants, number of killers and seed,
+each in a new process, so that the peak memory reported for a run is its own.
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from typing import Dict, List, Tuple
+import dsimulator.game as game
+import dsimulator.generator as gen
+
+PHASES = ['query_shortest_path', 'query_loc_time_inhabitant', 'select_victim', 'kill_inhabitant']
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+def peak_memory_kb() -> int:
+    """Return the peak resident set size of this process in KiB, or None if it is unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run(width: int, height: int, num_inhabitants: int, num_killers: int, days: int, seed: int) -> Dict:
+    """Start a game, play the given number of days, and return the timings."""
+    records = []
+    game.set_profiling(True)
+    game.perf_log.clear()
+    try:
+        start = time.perf_counter()
+        game.init_game(seed=seed, width=width, height=height, num_inhabitants=num_inhabitants, num_killers=num_killers)
+        init_seconds = time.perf_counter() - start
+        records.extend(game.perf_log)
+        game.perf_log.clear()
+
+        day_seconds = []
+        for _ in range(days):
+            start = time.perf_counter()
+            game.next_day()
+            day_seconds.append(time.perf_counter() - start)
+            records.extend(game.perf_log)
+            game.perf_log.clear()
+    finally:
+        game.set_profiling(False)
+        if game.db.con is not None:
+            game.close_game()
+
+    # The first day is simulated inside init_game(), hence day 1 is not in day_seconds.
+    per_day = {}
+    for r in records:
+        if r.name in PHASES:
+            phases = per_day.setdefault(r.day, dict.fromkeys(PHASES, 0.0))
+            phases[r.name] += r.seconds
+
+    return {
+        'width': width,
+        'height': height,
+        'num_inhabitants': num_inhabitants,
+        'num_killers': num_killers,
+        'seed': seed,
+        'init_game': init_seconds,
+        'next_day': day_seconds,
+        'phases': [dict(day=d, **phases) for d, phases in sorted(per_day.items())],
+        'total': {name: sum(r.seconds for r in records if r.name == name) for name in PHASES},
+        'peak_memory_kb': peak_memory_kb(),
+    }
+
+
+def parse_size(size: str) -> Tuple[int, int]:
+    """Parse a map size given as WIDTHxHEIGHT."""
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv: List[str] = None) -> int:
+    """Parse the command line, run the benchmarks and print the results."""
+    parser = argparse.ArgumentParser(prog='python -m dsimulator.bench', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=parse_size, nargs='+', default=[(10, 10)], help='map sizes as WIDTHxHEIGHT')
+    parser.add_argument('--inhabitants', type=int, nargs='+', default=[gen.NUM_INHABITANTS], help='numbers of inhabitants')
+    parser.add_argument('--killers', type=int, nargs='+', default=[1], help='numbers of killers')
+    parser.add_argument('--days', type=int, default=5, help='number of days to play after the first one')
+    parser.add_argument('--seed', type=int, nargs='+', default=[0], help='random seeds')
+    parser.add_argument('--output', help='write the JSON here instead of the standard output')
+    args = parser.parse_args(argv)
+    for width, height in args.size:
+        if width * height < gen.NUM_BUILDINGS:
+            parser.error('--size {0}x{1} has fewer vertices than the {2} buildings'.format(width, height, gen.NUM_BUILDINGS))
+
+    # The peak memory of a process only ever grows, hence a new worker process for every run.
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'), max_tasks_per_child=1) as executor:
+        results = [executor.submit(run, width, height, n, k, args.days, seed).result()
+                   for (width, height), n, k, seed in itertools.product(args.size, args.inhabitants, args.killers, args.seed)]
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as fd:
+            json.dump(results, fd, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Own the connections to the game state database and the save list database.
+
+The game state is an in-memory database in shared-cache mode, so that several connections can open it:
+a single writer connection, used by the game logic while holding the write lock,
+and a pool of read-only connections for the queries made by the UI, which hold the read lock.
+Any number of readers may run at the same time, but never together with a writer.
+
+A thread may also work on a staged copy of the game state, which replaces it atomically when done,
+so that a long computation does not keep the readers waiting.
+
+The generation counts the changes to the game state, so that a copy can tell whether it is still up to date.
+"""
+
+import contextlib
+import itertools
+import os
+import sqlite3
+import threading
+from typing import Any, Iterator, Tuple
+
+
+class ConnectionManager:
+    """Open, hand out and close the database connections, and serialize the writers with a lock."""
+
+    # Numbers the in-memory databases, which are shared by name within the process.
+    database_number = itertools.count()
+
+    def __init__(self, save_list_path: str) -> None:
+        """Prepare the manager without opening any database. The save list is kept at `save_list_path`."""
+        self.save_list_path = save_list_path
+        self.uri = None
+        self.con = None
+        self.readers = []
+        self.save_con = None
+        self.save_lock = threading.Lock()
+
+        self.condition = threading.Condition()
+        self.reading = 0
+        self.writer_thread = None
+        self.writing = 0
+        self.staging = False
+        self.local = threading.local()
+        self.generation = 0
+        self.entry_con = None
+        self.entry_changes = 0
+
+    def new_uri(self) -> str:
+        """Return the URI of a new in-memory database."""
+        return 'file:dsimulator-{0}-{1}?mode=memory&cache=shared'.format(os.getpid(), next(self.database_number))
+
+    def current(self) -> sqlite3.Connection:
+        """Return the writer connection of the calling thread, which is its staged copy of the game state if any."""
+        stage = getattr(self.local, 'stage', None)
+        return self.con if stage is None else stage
+
+    def holds_writer(self) -> bool:
+        """Return whether the calling thread holds the write lock or works on a staged copy."""
+        return getattr(self.local, 'stage', None) is not None or self.writer_thread == threading.get_ident()
+
+    def open(self) -> sqlite3.Connection:
+        """Close the current game state database if any, then open a new empty one and return its writer connection."""
+        with self.writer():
+            self.close()
+            self.uri = self.new_uri()
+            # check_same_thread=False is necessary as the writer may be any thread holding the write lock.
+            self.con = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            return self.con
+
+    def close(self) -> None:
+        """Close all the connections to the game state database, which is then discarded."""
+        with self.writer():
+            for read_con in self.readers:
+                read_con.close()
+            self.readers.clear()
+            if self.con is not None:
+                self.con.close()
+            self.uri = None
+            self.con = None
+
+    @contextlib.contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Hold the write lock and give the writer connection, which is committed when the outermost writer exits.
+
+        The lock is reentrant, so a writer may call other writers.
+        The generation is incremented if the outermost writer has changed the game state or replaced it.
+        A thread with a staged copy writes to it without locking, and the other writers wait until it is swapped in.
+        """
+        stage = getattr(self.local, 'stage', None)
+        if stage is not None:
+            yield stage
+            return
+
+        with self.condition:
+            if self.writer_thread != threading.get_ident():
+                while self.writer_thread is not None or self.reading > 0 or self.staging:
+                    self.condition.wait()
+                self.writer_thread = threading.get_ident()
+                self.entry_con = self.con
+                self.entry_changes = 0 if self.con is None else self.con.total_changes
+            self.writing += 1
+        try:
+            yield self.con
+        finally:
+            with self.condition:
+                self.writing -= 1
+                if self.writing == 0:
+                    if self.con is not None and self.con.in_transaction:
+                        self.con.commit()
+                    if self.con is not self.entry_con or (self.con is not None and self.con.total_changes != self.entry_changes):
+                        self.generation += 1
+                    self.entry_con = None
+                    self.writer_thread = None
+                    self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Hold the read lock and give a read-only connection from the pool.
+
+        A writer reading gets its own writer connection instead, as it may have uncommitted changes,
+        and so does a thread with a staged copy.
+        """
+        stage = getattr(self.local, 'stage', None)
+        if stage is not None:
+            yield stage
+            return
+
+        with self.condition:
+            in_writer = self.writer_thread == threading.get_ident()
+            if not in_writer:
+                while self.writer_thread is not None:
+                    self.condition.wait()
+                self.reading += 1
+                read_con = self.readers.pop() if self.readers else None
+        if in_writer:
+            yield self.con
+            return
+
+        try:
+            if read_con is None:
+                read_con = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+                read_con.execute('PRAGMA query_only = ON')
+            yield read_con
+        finally:
+            with self.condition:
+                if read_con is not None:
+                    self.readers.append(read_con)
+                self.reading -= 1
+                self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def staged(self) -> Iterator[sqlite3.Connection]:
+        """
+        Copy the game state into a new database that replaces it atomically when the block exits without an exception.
+
+        Until then, the calling thread reads and writes the copy while the other threads keep reading the game state.
+        The copy is discarded if an exception is raised.
+        """
+        with self.condition:
+            while self.writer_thread is not None or self.staging:
+                self.condition.wait()
+            self.staging = True
+
+        try:
+            uri = self.new_uri()
+            stage = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            with self.reader() as read_con:
+                read_con.backup(stage)
+
+            self.local.stage = stage
+            try:
+                yield stage
+                if stage.in_transaction:
+                    stage.commit()
+            except BaseException:
+                stage.close()
+                raise
+            finally:
+                self.local.stage = None
+
+            with self.condition:
+                while self.reading > 0:
+                    self.condition.wait()
+                for read_con in self.readers:
+                    read_con.close()
+                self.readers.clear()
+                self.con.close()
+                self.uri = uri
+                self.con = stage
+                self.generation += 1
+        finally:
+            with self.condition:
+                self.staging = False
+                self.condition.notify_all()
+
+    def serialize(self) -> Tuple[bytes, int]:
+        """Return the game state serialized, and the generation that it is."""
+        with self.reader() as read_con:
+            return read_con.serialize(), self.generation
+
+    def load(self, data: bytes) -> None:
+        """Replace the game state with the serialized database. The caller must hold the write lock."""
+        assert self.writer_thread == threading.get_ident()
+        # A deserialized connection is detached from the shared cache, hence the copy.
+        temp_con = sqlite3.connect(':memory:')
+        temp_con.deserialize(data)
+        uri = self.new_uri()
+        con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        temp_con.backup(con)
+        temp_con.close()
+
+        for read_con in self.readers:
+            read_con.close()
+        self.readers.clear()
+        if self.con is not None:
+            self.con.close()
+        self.uri = uri
+        self.con = con
+
+    @contextlib.contextmanager
+    def save_list(self) -> Iterator[sqlite3.Connection]:
+        """Give the connection to the save list database in a transaction, opening it and keeping it the first time."""
+        with self.save_lock:
+            if self.save_con is None:
+                os.makedirs(os.path.dirname(self.save_list_path), exist_ok=True)
+                self.save_con = sqlite3.connect(self.save_list_path, check_same_thread=False)
+                with self.save_con:
+                    self.save_con.execute('''CREATE TABLE IF NOT EXISTS save(
+                                                 save_id   INTEGER NOT NULL,
+                                                 timestamp INTEGER NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                                                           PRIMARY KEY(save_id)
+                                             )''')
+            with self.save_con:
+                yield self.save_con
+
+
+class CurrentConnection:
+    """
+    Stand for the writer connection of the calling thread, as given by `ConnectionManager.current()`.
+
+    It can be used like a connection, so that code written for a single connection runs on a staged copy unchanged.
+    """
+
+    def __init__(self, manager: ConnectionManager) -> None:
+        """Refer to the connections of `manager`."""
+        self.manager = manager
+
+    def __getattr__(self, name: str) -> Any:
+        """Get the attribute of the current connection."""
+        return getattr(self.manager.current(), name)
+
+    def __enter__(self) -> sqlite3.Connection:
+        """Start a transaction on the current connection."""
+        return self.manager.current().__enter__()
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        """Commit or roll back the transaction on the current connection."""
+        return self.manager.current().__exit__(*exc_info)
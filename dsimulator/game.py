@@ -1,30 +1,196 @@
 """
 This module maintains the connection to a in-memory database storing the game state.
 
-The database connection is stored as a global variable.
+The connections are owned by the connection manager `db`, and `con` stands for its writer connection,
+which is only used while holding the write lock, i.e. in functions decorated with `writes`.
 Functions are provided to initialize, manipulate, and query the game state database.
+The queries made by the UI use read-only connections instead.
 """
 
 import os
 import sqlite3
+import threading
+import time
+import concurrent.futures
+import functools
+import multiprocessing
+import collections
+import numpy as np
 from dsimulator.defs import ROOT_DIR
+import dsimulator.database as database
 import dsimulator.generator as gen
-from typing import List, Tuple
+import dsimulator.pathfinding as pathfinding
+import dsimulator.itinerary as itinerary
+import dsimulator.witness as witness
+import dsimulator.victim as victim
+import dsimulator.query as query
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Tuple
 
-con = None
+SAVE_DIR = os.path.expanduser('~/.dsimulator')
+SAVE_LIST = os.path.join(SAVE_DIR, "save.db")
+
+db = database.ConnectionManager(SAVE_LIST)
+con = database.CurrentConnection(db)
 day = None
 resig_day = None
+rng = None
+
+# The road graph with its in-edges and the distance matrix that `dist` was built from,
+# kept between turns so that lockdown changes can be applied incrementally.
+graph = None
+reverse_graph = None
+blocked = None
+dist_matrix = None
+dist_version = None
+
+# The `(killer_id, killer_inhabitant_id)` of the killers, the feature matrix of the inhabitants
+# and their scores as potential victims of each killer, built once per game as they do not change during a game.
+killers = None
+features = None
+victim_scores = None
+
+# The worker processes ranking the potential victims of the killers when there are several of them.
+killer_pool = None
+
+# The globals that a turn reads and changes besides the game state database, the random number generator aside.
+TURN_STATE = ['day', 'resig_day', 'graph', 'reverse_graph', 'blocked', 'dist_matrix', 'dist_version', 'killers', 'features', 'victim_scores']
+
+# The next day computed in advance by speculate(), as a future of the generation of the game state that it started from,
+# the serialized game state and the turn state after the day. The token tells the latest speculation from the stale ones,
+# and is shared with the worker process as `latest_speculation`, so that it stops computing a stale one.
+speculating = False
+speculation = None
+speculation_token = 0
+speculation_thread = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='speculation')
+speculation_executor = None
+latest_speculation = None
+
+# The seconds that a speculation waits before copying the game state, so that a burst of changes,
+# such as toggling several lockdowns, only copies it once, as each change supersedes the previous speculation.
+SPECULATION_DELAY = 0.5
+
+
+def split_script(script: str) -> List[str]:
+    """Split an SQL script into its statements, keeping the statements in trigger bodies together."""
+    statements = []
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ''
+    return statements
+
+
+def load_scripts(file_names: List[str]) -> Dict[str, List[str]]:
+    """Read and split the script files given the file names."""
+    scripts = {}
+    for file_name in file_names:
+        with open(os.path.join(ROOT_DIR, file_name)) as fd:
+            scripts[file_name] = split_script(fd.read())
+    return scripts
+
+
+# The statements of the SQL scripts, read once when the module is imported.
+SCRIPTS = load_scripts(['DDL.sql', 'shortest_path.sql', 'init_loc_time.sql',
+                        'victim_common_attribute.sql', 'kill_trigger.sql', 'graph_version.sql'])
+
+
+class PerfRecord(NamedTuple):
+    """The measurements of one call of a profiled function. `changes` is None for a call made without the write lock."""
+
+    name: str
+    args: str
+    day: int
+    seconds: float
+    rows: int
+    changes: int
+
+
+# The most recent measurements, only recorded when profiling is on.
+PERF_LOG_SIZE = 1000
+perf_log: Deque[PerfRecord] = collections.deque(maxlen=PERF_LOG_SIZE)
+profiling = False
+
+
+def set_profiling(enabled: bool) -> None:
+    """Turn the recording of measurements into `perf_log` on or off."""
+    global profiling
+    profiling = enabled
+
+
+def count_rows(result: Any) -> int:
+    """Return the number of rows in the result of a query function, or None if it does not return rows."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], list):
+        # The (column names, rows) pairs.
+        return len(result[1])
+    if isinstance(result, tuple):
+        return 1
+    return None
+
+
+def profiled(f: Callable) -> Callable:
+    """
+    Record the duration, the number of rows returned and the number of rows changed in the database by each call of `f`.
 
+    The rows changed are only counted for the calls holding the write lock, as the changes are counted
+    on the writer connection, which another thread may be using meanwhile for the calls that only read.
+    When profiling is off, the only overhead is checking the flag.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if not profiling:
+            return f(*args, **kwargs)
+
+        writer = db.holds_writer()
+        changes = con.total_changes if writer else None
+        start = time.perf_counter()
+        result = f(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        perf_log.append(PerfRecord(f.__name__, ', '.join(map(str, args)), day, seconds,
+                                   count_rows(result), con.total_changes - changes if writer else None))
+        return result
+    return wrapper
+
+
+def writes(f: Callable) -> Callable:
+    """Hold the write lock of the game state database during each call of `f`, and commit when it returns."""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        with db.writer():
+            return f(*args, **kwargs)
+    return wrapper
+
+
+@writes
+def init_game(seed: int = None, width: int = 10, height: int = 10, num_inhabitants: int = gen.NUM_INHABITANTS,
+              num_killers: int = 1) -> None:
+    """
+    Create the schema for the in-memory game state database, then populate it procedurally.
 
-def init_game() -> None:
-    """Create the schema for the in-memory game state database, then populate it procedurally."""
-    global con
+    `seed` seeds the random number generators for both the world generation and the daily simulation.
+    The map is a grid of `width` by `height` vertices, and `num_killers` killers hide among the inhabitants.
+    Raise ValueError before anything is generated if the map has fewer vertices than there are buildings.
+    """
     global day
     global resig_day
-
-    # check_same_thread=False is necessary for allowing query by UI handler.
-    # I am not sure why the UI is still multithreaded even though I turned on manual callback management.
-    con = sqlite3.connect(":memory:", check_same_thread=False)
+    global rng
+    global dist_matrix
+    global features
+    global victim_scores
+
+    if width * height < gen.NUM_BUILDINGS:
+        raise ValueError('A {0}x{1} map has {2} vertices, but {3} buildings need a vertex each'.format(
+            width, height, width * height, gen.NUM_BUILDINGS))
+    db.open()
+    rng = np.random.default_rng(seed)
+    if seed is not None:
+        gen.seed(seed)
+    dist_matrix = None
+    features = None
+    victim_scores = None
 
     run_script('DDL.sql')
 
@@ -33,36 +199,139 @@ def init_game() -> None:
     day = 0
     resig_day = 15
 
-    gen.generate_map(con)
-    gen.generate_home(con)
-    gen.generate_workplace(con)
-    gen.generate_inhabitants_and_relationships(con)
-    gen.generate_test_killer(con)
+    gen.generate_map(con, width, height, rng)
+    allocator = gen.BuildingAllocator(con)
+    gen.generate_home(con, allocator=allocator)
+    gen.generate_workplace(con, allocator=allocator)
+    killer_inhabitant_id = gen.generate_inhabitants_and_relationships(con, num_inhabitants)
+    gen.generate_test_killer(con, killer_inhabitant_id, num_killers)
     gen.init_status(con)
     init_commonality_view()
     init_kill_trigger()
+    init_graph_version()
     create_lockdown_building_view()
     create_modified_edge_view()
+    init_victim_scores()
+    init_loc_time()
+    init_table_version()
+
+    compute_next_day()
+    # Gather the statistics of the query planner once the working tables of the day are filled too.
+    con.execute('ANALYZE')
+    speculate()
 
-    next_day()
 
+def next_day(progress: Callable[[str, float], None] = None) -> None:
+    """
+    End the turn and proceed to the next day, then start computing the day after in advance if speculating.
+
+    The day computed in advance is used if the game state has not changed since, otherwise the day is computed now.
+    `progress` is called with the name of each phase and the fraction of the turn done before it.
+    """
+    if not commit_speculation():
+        compute_next_day(progress)
+    speculate()
 
-def next_day() -> None:
-    """End the turn and proceed to the next day."""
+
+@writes
+def compute_next_day(progress: Callable[[str, float], None] = None) -> None:
+    """
+    Compute the next day from the current game state.
+
+    `progress` is called with the name of each phase and the fraction of the turn done before it.
+    """
     global day
+    report = progress or (lambda phase, fraction: None)
     day += 1
     with con:
         con.execute('UPDATE STATUS SET day = ?', (day,))
 
+    report('Finding the shortest paths', 0.0)
     query_shortest_path()
-    # print('Queried `dist`')
+    report('Moving the inhabitants', 0.3)
     query_loc_time_inhabitant()
-    # print('Queried `loc_time`')
-    victim = select_victim()
-    # print('Selected the victim')
-    if victim is not None:
-        kill_inhabitant(select_victim())
-    # print('Victim killed')
+    report('Selecting the victims', 0.6)
+    for selected in select_victim():
+        kill_inhabitant(selected)
+    report('Counting the witnesses', 0.8)
+    query_witness_count_table()
+    # Refresh the statistics of the tables that have grown a lot, such as `victim`.
+    con.execute('PRAGMA optimize')
+
+
+class TurnCancelled(Exception):
+    """Raised in a turn computed in the background when it is cancelled."""
+
+
+class Turn:
+    """A turn computed in the background by start_next_day(), whose progress can be polled."""
+
+    def __init__(self) -> None:
+        """Start with no progress."""
+        self.phase = None
+        self.fraction = 0.0
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def report(self, phase: str, fraction: float) -> None:
+        """Record the progress, or raise TurnCancelled if the turn has been cancelled."""
+        if self.cancelled.is_set():
+            raise TurnCancelled()
+        self.phase = phase
+        self.fraction = fraction
+
+    def cancel(self) -> None:
+        """Stop the turn at the beginning of its next phase, leaving the game as it was."""
+        self.cancelled.set()
+
+    def done(self) -> bool:
+        """Return whether the turn has finished, been cancelled, or failed."""
+        return self.future.done()
+
+
+# Runs the turns one at a time in the background.
+turn_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='turn')
+
+
+def start_next_day() -> Turn:
+    """
+    Compute the next day in the background, and return the turn for polling its progress.
+
+    The turn is computed on a staged copy of the game state, which replaces the game state when the turn finishes,
+    so that the UI can keep querying the current day meanwhile.
+    """
+    turn = Turn()
+    turn.future = turn_executor.submit(run_turn, turn)
+    return turn
+
+
+def run_turn(turn: Turn) -> None:
+    """
+    Compute the next day on a staged copy of the game state, and restore the game if the turn does not finish.
+
+    The day computed in advance is committed instead if it is up to date, which cannot be cancelled.
+    """
+    global day
+    global dist_matrix
+    if commit_speculation():
+        turn.phase = 'Done'
+        turn.fraction = 1.0
+        speculate()
+        return
+
+    saved_day = day
+    saved_rng = rng.bit_generator.state
+    try:
+        with db.staged():
+            compute_next_day(turn.report)
+            turn.report('Done', 1.0)
+    except BaseException:
+        day = saved_day
+        rng.bit_generator.state = saved_rng
+        # The distance matrix is repaired in place, so it is rebuilt from the game state on the next turn.
+        dist_matrix = None
+        raise
+    speculate()
 
 
 def end_game_condition(examined_inhabitant: int = None) -> Tuple[bool, bool]:
@@ -74,12 +343,15 @@ def end_game_condition(examined_inhabitant: int = None) -> Tuple[bool, bool]:
     if day >= resig_day:
         game_end = True
     if examined_inhabitant is not None:
-        killer_inhabitant_id = con.execute("SELECT killer_inhabitant_id FROM status").fetchone()[0]
-        if examined_inhabitant == killer_inhabitant_id:
-            game_win = True
+        with db.reader() as read_con:
+            cur = read_con.execute("SELECT EXISTS(SELECT * FROM killer WHERE killer_inhabitant_id = ?)", (examined_inhabitant,))
+            if cur.fetchone()[0]:
+                game_win = True
     return (game_end, game_win)
 
 
+@writes
+@profiled
 def kill_inhabitant(victim: int) -> None:
     """Insert `(victim_id, scene_vertex_id, min_of_death)` into `victim` table."""
     global con
@@ -88,15 +360,18 @@ def kill_inhabitant(victim: int) -> None:
         con.execute("INSERT INTO victim VALUES (?,?,?,?)", (victim[0], day, victim[2], victim[1]))
 
 
+@writes
 def close_game() -> None:
     """Close the connection to game state database."""
-    global con
-    con.close()
-    con = None
-
-
-SAVE_DIR = os.path.expanduser('~/.dsimulator')
-SAVE_LIST = os.path.join(SAVE_DIR, "save.db")
+    global dist_matrix
+    global features
+    global victim_scores
+    db.close()
+    shutdown_killer_pool()
+    supersede_speculation()
+    dist_matrix = None
+    features = None
+    victim_scores = None
 
 
 def to_save_path(save_id: int) -> str:
@@ -104,157 +379,291 @@ def to_save_path(save_id: int) -> str:
     return os.path.join(SAVE_DIR, str(save_id) + '.db')
 
 
-def create_save_list() -> None:
-    """Create the database that stores the list of save slots if it does not exist."""
-    if not os.path.exists(SAVE_DIR):
-        os.makedirs(SAVE_DIR)
+def list_save() -> List[Tuple[int, str]]:
+    """Get a list of the save slots."""
+    with db.save_list() as list_con:
+        cur = list_con.execute('''  SELECT save_id, datetime(timestamp)
+                                      FROM save
+                                  ORDER BY timestamp DESC''')
+        return cur.fetchall()
 
-    list_con = sqlite3.connect(SAVE_LIST)
-    with list_con:
-        list_con.execute('''CREATE TABLE IF NOT EXISTS save(
-                                save_id   INTEGER NOT NULL,
-                                timestamp INTEGER NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                                          PRIMARY KEY(save_id)
-                            )''')
-    list_con.close()
 
+# The version of the format of the save files, kept as their user_version. read_save() only reads the saves of
+# this version, and it must be incremented whenever the schema changes.
+SAVE_VERSION = 1
 
-def list_save() -> List[Tuple[int, str]]:
-    """Get a list of the save slots."""
-    create_save_list()
-    list_con = sqlite3.connect(SAVE_LIST)
-    cur = list_con.execute('''  SELECT save_id, datetime(timestamp)
-                                  FROM save
-                              ORDER BY timestamp DESC''')
-    result = cur.fetchall()
-    list_con.close()
-    return result
+
+class SaveError(Exception):
+    """Raised when a save cannot be read, e.g. as it was written by an incompatible version of the game."""
 
 
+@writes
 def read_save(save_id: int) -> None:
-    """Read the saved database into the in-memory database."""
-    global con
+    """
+    Read the saved database into the in-memory database.
+
+    Raise SaveError without changing the game state if the save is missing or of another version.
+    If it cannot be read anyway, the game is closed before SaveError is raised, rather than left half loaded.
+    """
     global day
     global resig_day
-
-    # check_same_thread=False is necessary for allowing query by UI handler.
-    # I am not sure why the UI is still multithreaded even though I turned on manual callback management.
-    con = sqlite3.connect(":memory:", check_same_thread=False)
-
-    save_con = sqlite3.connect(to_save_path(save_id))
-    with save_con:
-        save_con.backup(con)
-    save_con.close()
-
-    cur = con.execute('SELECT day, resignation_day FROM status')
-    day, resig_day = cur.fetchone()
+    global rng
+    global dist_matrix
+    global features
+    global victim_scores
+
+    path = to_save_path(save_id)
+    if not os.path.exists(path):
+        raise SaveError('Save {0} does not exist.'.format(save_id))
+    save_con = sqlite3.connect(path)
+    try:
+        try:
+            version = save_con.execute('PRAGMA user_version').fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            raise SaveError('Save {0} is not a valid save: {1}.'.format(save_id, e)) from e
+        if version != SAVE_VERSION:
+            raise SaveError('Save {0} was written by an incompatible version of the game.'.format(save_id))
+
+        try:
+            db.open()
+            rng = np.random.default_rng()
+            dist_matrix = None
+            features = None
+            victim_scores = None
+
+            with save_con:
+                save_con.backup(db.current())
+
+            cur = con.execute('SELECT day, resignation_day FROM status')
+            day, resig_day = cur.fetchone()
+            init_victim_scores()
+
+            # Rebuild the caches, which are not saved. `dist` is only rebuilt when needed, as it is the largest.
+            query_witness_count_table()
+            con.execute('ANALYZE')
+        except sqlite3.Error as e:
+            close_game()
+            raise SaveError('Save {0} cannot be read: {1}.'.format(save_id, e)) from e
+    finally:
+        save_con.close()
+    speculate()
 
 
 def write_save(save_id: int = None) -> None:
-    """Write the in-memory database into the save file (on-disk database)."""
-    global con
-    create_save_list()
+    """
+    Write the in-memory database into the save file (on-disk database).
 
-    list_con = sqlite3.connect(SAVE_LIST)
-    with list_con:
+    Only the rows of the tables that are not caches are saved. The tables whose version in `table_version` is the same
+    in the save file are skipped, and only the rows of the others that differ from the save file are written,
+    unless its schema is different or most of the rows have changed, and it is written again from scratch.
+    """
+    with db.save_list() as list_con:
         if save_id is None:
             cur = list_con.execute('INSERT INTO save DEFAULT VALUES')
             save_id = cur.lastrowid
         else:
             list_con.execute('REPLACE INTO save (save_id) VALUES (?)', (save_id,))
-    list_con.close()
 
-    save_con = sqlite3.connect(to_save_path(save_id))
-    with save_con:
-        con.backup(save_con)
-    save_con.close()
+    # Saving only reads the game state, so the UI can keep querying it meanwhile.
+    path = to_save_path(save_id)
+    with db.reader():
+        # The read-only connections cannot write to an attached database.
+        game_con = sqlite3.connect(db.uri, uri=True)
+        try:
+            objects = list_schema(game_con, 'main')
+            tables = [name for kind, name, _ in objects if kind == 'table' and name not in CACHE_TABLES]
+            dirty = None
+            if os.path.exists(path):
+                game_con.execute('ATTACH DATABASE ? AS save', (path,))
+                if game_con.execute('PRAGMA save.user_version').fetchone()[0] == SAVE_VERSION \
+                        and sorted(list_schema(game_con, 'save')) == sorted(objects) \
+                        and not any(game_con.execute('SELECT EXISTS(SELECT * FROM save."{0}")'.format(t)).fetchone()[0]
+                                    for t in CACHE_TABLES if any(o[1] == t for o in objects)):
+                    dirty = dirty_tables(game_con, tables)
+                game_con.execute('DETACH DATABASE save')
+                if dirty is None:
+                    os.remove(path)
+
+            if dirty is not None:
+                game_con.execute('ATTACH DATABASE ? AS save', (path,))
+                with game_con:
+                    for table in sorted(tables, key=lambda t: TRIGGER_TABLES.index(t) if t in TRIGGER_TABLES else -1):
+                        if table in dirty or (dirty and table in TRIGGER_TABLES):
+                            save_table(game_con, table)
+                return
+
+            # Written from scratch, the indexes and the triggers are only created once the rows are copied.
+            save_con = sqlite3.connect(path)
+            save_con.execute('PRAGMA user_version = {0}'.format(SAVE_VERSION))
+            with save_con:
+                for kind, _, sql in objects:
+                    if kind == 'table':
+                        save_con.execute(sql)
+            game_con.execute('ATTACH DATABASE ? AS save', (path,))
+            with game_con:
+                for table in tables:
+                    copy_table(game_con, table)
+            game_con.execute('DETACH DATABASE save')
+            with save_con:
+                for kind, _, sql in objects:
+                    if kind != 'table':
+                        save_con.execute(sql)
+            save_con.close()
+        finally:
+            game_con.close()
+
+
+# The tables derived from the others, which are rebuilt when a save is read, hence saved empty.
+CACHE_TABLES = ['dist', 'src_dst', 'witness_count']
+
+# The tables changed by triggers on the other tables. They are saved last, in this order, so that the changes made
+# by the triggers when the other tables are saved are overwritten, and saved whenever any other table is.
+TRIGGER_TABLES = ['inhabitant', 'graph_version', 'commonality_counts', 'table_version']
+
+# The tables emptied and filled again every day, whose version is changed once then instead of by a trigger per row.
+REBUILT_TABLES = ['loc_time']
+
+# The fraction of the saved rows changed since the save file was written above which it is written again from scratch.
+REWRITE_FRACTION = 0.5
+
+
+def list_schema(con: sqlite3.Connection, schema: str) -> List[Tuple[str, str, str]]:
+    """Return the `(type, name, sql)` of the tables, indexes, views and triggers of the schema, in order of creation."""
+    return con.execute('''  SELECT type, name, sql
+                              FROM "{0}".sqlite_master
+                             WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+                          ORDER BY rowid'''.format(schema)).fetchall()
+
+
+def dirty_tables(con: sqlite3.Connection, tables: List[str]) -> List[str]:
+    """
+    Return the tables that differ between the game state and the attached `save` database, by their `table_version`.
+
+    A table without a version is taken as changed. Return None if most of the rows have changed,
+    counting all the rows of a table whose changes cannot be counted as the save is not one of its earlier versions.
+    """
+    saved = {}
+    current = {}
+    if 'table_version' in tables:
+        saved = {r[0]: r[1:] for r in con.execute('SELECT table_name, version, changes FROM save.table_version')}
+        current = {r[0]: r[1:] for r in con.execute('SELECT table_name, version, changes FROM main.table_version')}
+    dirty = [t for t in tables if t != 'table_version' and (t not in saved or saved[t] != current.get(t))]
+
+    rows = {t: con.execute('SELECT COUNT(*) FROM main."{0}"'.format(t)).fetchone()[0] for t in tables}
+    changed = 0
+    for t in dirty:
+        if t in saved and t in current and current[t][1] > saved[t][1]:
+            changed += min(current[t][1] - saved[t][1], rows[t])
+        else:
+            changed += rows[t]
+    return None if changed > REWRITE_FRACTION * sum(rows.values()) else dirty
+
+
+def save_table(con: sqlite3.Connection, table: str) -> None:
+    """Make the table of the attached `save` database equal to the table of the game state, writing only the differences."""
+    columns = [r[1] for r in con.execute('PRAGMA main.table_info("{0}")'.format(table))]
+    same = ' AND '.join('s."{0}" IS g."{0}"'.format(c) for c in columns)
+    con.execute('''DELETE FROM save."{0}" AS s
+                    WHERE NOT EXISTS (SELECT * FROM main."{0}" AS g WHERE {1})'''.format(table, same))
+    con.execute('''INSERT INTO save."{0}"
+                   SELECT * FROM main."{0}" AS g
+                    WHERE NOT EXISTS (SELECT * FROM save."{0}" AS s WHERE {1})'''.format(table, same))
+
+
+def copy_table(con: sqlite3.Connection, table: str) -> None:
+    """Copy the table of the game state into the empty table of the attached `save` database."""
+    con.execute('INSERT INTO save."{0}" SELECT * FROM main."{0}"'.format(table))
 
 
 def delete_save(save_id: int) -> None:
     """Delete the save slot."""
-    list_con = sqlite3.connect(SAVE_LIST)
-    with list_con:
+    with db.save_list() as list_con:
         list_con.execute('DELETE FROM save WHERE save_id = ?', (save_id,))
-    list_con.close()
 
     os.remove(to_save_path(save_id))
 
 
 def list_vertex() -> List[Tuple[int, int]]:
     """Return a list of coordinates for all vertices."""
-    cur = con.execute('SELECT vertex_id, x, y FROM vertex')
-    return cur.fetchall()
+    with db.reader() as read_con:
+        cur = read_con.execute('SELECT vertex_id, x, y FROM vertex')
+        return cur.fetchall()
 
 
-def list_edge() -> List[Tuple[int, int, int, int, int]]:
+def list_edge() -> List[Tuple[int, int, int, int, int, int, int]]:
     """
-    Return a list of start-end coordinates and cost for all edges in one direction.
+    Return a list of start-end vertices, start-end coordinates and cost for all edges in one direction.
 
     As the map edges are added twice for two directions, only those with start < end will be considered.
     """
-    cur = con.execute('''SELECT s.x, s.y, e.x, e.y, cost_min
-                           FROM edge
-                                JOIN vertex AS s
-                                ON start = s.vertex_id
-                                JOIN vertex AS e
-                                ON end = e.vertex_id
-                          WHERE start < end''')
-    return cur.fetchall()
-
-
-def list_building() -> List[Tuple[int, int, int, str]]:
-    """Return a list of basic building information for all buildings."""
-    cur = con.execute('''SELECT x, y, building_id, building_name
-                           FROM building
-                           JOIN vertex
-                                ON building_id=vertex_id''')
-    return cur.fetchall()
-
-
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT start, end, s.x, s.y, e.x, e.y, cost_min
+                                    FROM edge
+                                         JOIN vertex AS s
+                                         ON start = s.vertex_id
+                                         JOIN vertex AS e
+                                         ON end = e.vertex_id
+                                   WHERE start < end''')
+        return cur.fetchall()
+
+
+def list_building() -> List[Tuple[int, int, int, str, int]]:
+    """Return a list of basic building information and the lockdown status for all buildings."""
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT x, y, building_id, building_name, lockdown
+                                    FROM building
+                                    JOIN vertex
+                                         ON building_id=vertex_id''')
+        return cur.fetchall()
+
+
+@profiled
 def query_building_summary(building_id: int) -> Tuple[str, int, int]:
     """Get the name and lockdown status of a building and whether it is a home."""
-    cur = con.execute('SELECT building_name, lockdown FROM building WHERE building_id = ?', (building_id,))
-    building_name, lockdown = cur.fetchone()
-    cur = con.execute('SELECT COUNT(*) FROM home WHERE home_building_id = ?', (building_id,))
-    home = cur.fetchone()[0]
-    return building_name, lockdown, home
+    with db.reader() as read_con:
+        cur = read_con.execute('SELECT building_name, lockdown FROM building WHERE building_id = ?', (building_id,))
+        building_name, lockdown = cur.fetchone()
+        cur = read_con.execute('SELECT COUNT(*) FROM home WHERE home_building_id = ?', (building_id,))
+        home = cur.fetchone()[0]
+        return building_name, lockdown, home
 
 
+@profiled
 def query_home_income(building_id: int) -> Tuple[int, int, int]:
     """Get the income range of a home building."""
-    cur = con.execute('''SELECT low, high
-                           FROM home
-                                JOIN
-                                income_range
-                                USING(income_level)
-                          WHERE home_building_id = ?''',
-                      (building_id,))
-    return cur.fetchone()
-
-
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT low, high
+                                    FROM home
+                                         JOIN
+                                         income_range
+                                         USING(income_level)
+                                   WHERE home_building_id = ?''',
+                               (building_id,))
+        return cur.fetchone()
+
+
+@profiled
 def query_workplace_occupation(building_id: int) -> Tuple[Tuple[str, ...], Tuple]:
     """List the occupations for the occupations in a building."""
-    cur = con.execute('''SELECT occupation_name, income, arrive_min, leave_min
-                           FROM workplace
-                                JOIN occupation
-                                USING(occupation_id)
-                          WHERE workplace_building_id = ?''',
-                      (building_id,))
-    return ('occupation_name', 'income', 'arrive_min', 'leave_min'), \
-        cur.fetchall()
-
-
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT occupation_name, income, arrive_min, leave_min
+                                    FROM workplace
+                                         JOIN occupation
+                                         USING(occupation_id)
+                                   WHERE workplace_building_id = ?''',
+                               (building_id,))
+        return ('occupation_name', 'income', 'arrive_min', 'leave_min'), \
+            cur.fetchall()
+
+
+@writes
 def toggle_lockdown(building_id: int) -> None:
     """Set/unset given building to lockdown."""
-    cur = con.execute('''
-        SELECT COUNT(*)
-        FROM building
-        WHERE building_id = {0} AND lockdown = TRUE'''.format(building_id))
-
     con.execute('''
         UPDATE building
         SET lockdown = 1 - lockdown
-        WHERE building_id = {0};'''.format(building_id))
+        WHERE building_id = ?''', (building_id,))
+    speculate()
 
 
 def create_lockdown_building_view() -> None:
@@ -280,38 +689,76 @@ def create_modified_edge_view() -> None:
                 ''')
 
 
+@profiled
 def query_inhabitant_relationship(subject_id: int) -> List[Tuple]:
     """Return the list of inhabitants having relations with subject."""
-    cur = con.execute('''
-        SELECT inhabitant.inhabitant_id, first_name, last_name, description
-          FROM relationship
-               JOIN inhabitant
-               ON inhabitant_id = object_id
-         WHERE subject_id = {0}'''.format(subject_id))
-    return cur.fetchall()
+    with db.reader() as read_con:
+        cur = read_con.execute('''
+            SELECT inhabitant.inhabitant_id, first_name, last_name, description
+              FROM relationship
+                   JOIN inhabitant
+                   ON inhabitant_id = object_id
+             WHERE subject_id = ?''', (subject_id,))
+        return cur.fetchall()
 
 
+@writes
 def modify_suspect(inhabitant_id: int) -> None:
     """Set/unset given inhabitant in suspect."""
     cur = con.execute('''
         SELECT COUNT(*)
         FROM suspect
-        WHERE inhabitant_id = {0}'''.format(inhabitant_id))
+        WHERE inhabitant_id = ?''', (inhabitant_id,))
 
     if cur.fetchone()[0] == 0:
         con.execute('''
             INSERT INTO suspect
-            VALUES ({0})'''.format(inhabitant_id))
+            VALUES (?)''', (inhabitant_id,))
     else:
         con.execute('''
             DELETE FROM suspect
-            WHERE inhabitant_id = {0}'''.format(inhabitant_id))
+            WHERE inhabitant_id = ?''', (inhabitant_id,))
+    speculate()
 
 
+@writes
+@profiled
 def query_shortest_path() -> None:
-    """Get the shortest path between all vertex pairs in a table `dist`."""
+    """
+    Get the shortest path between all vertex pairs in a table `dist`.
+
+    The distances are computed from scratch once per game (or loaded save), or when an edge has changed.
+    Afterwards, only the pairs affected by the buildings whose lockdown status has changed are repaired,
+    and nothing is done if the road graph is the same as when `dist` was last built.
+    """
+    global graph
+    global reverse_graph
+    global blocked
+    global dist_matrix
+    global dist_version
+
+    version = con.execute('SELECT lockdown, edge FROM graph_version').fetchone()
+    if dist_matrix is not None and version == dist_version:
+        return
+    full = dist_matrix is None or version[1] != dist_version[1]
+    dist_version = version
+
+    if full:
+        graph = pathfinding.load_adjacency(con)
+        vertex_ids, indptr, indices, weights = graph
+        reverse_graph = pathfinding.reverse_adjacency(indptr, indices, weights)
+        blocked = pathfinding.load_blocked(con, vertex_ids)
+        dist_matrix = pathfinding.all_pairs(indptr, indices, weights, blocked)
+        with con:
+            run_script('shortest_path.sql')
+            pathfinding.write_dist(con, vertex_ids, dist_matrix)
+        return
+
+    vertex_ids, indptr, indices, weights = graph
+    new_blocked = pathfinding.load_blocked(con, vertex_ids)
+    changed = pathfinding.update_blocked(dist_matrix, indptr, indices, weights, reverse_graph, blocked, new_blocked)
     with con:
-        run_script('shortest_path.sql')
+        pathfinding.update_dist(con, vertex_ids, dist_matrix, changed)
 
 
 def init_loc_time() -> None:
@@ -320,14 +767,23 @@ def init_loc_time() -> None:
         run_script('init_loc_time.sql')
 
 
+@profiled
 def query_loc_time() -> None:
-    """Insert the location-time tuples into `loc_time`, specifying paths that satisfy the constraints given in `src_dst`."""
+    """
+    Insert the location-time tuples into `loc_time`, specifying paths that satisfy the constraints given in `src_dst`.
+
+    query_shortest_path() must be run before calling this function.
+    """
+    legs = con.execute('SELECT inhabitant_id, src, dst, t_src, t_dst FROM src_dst').fetchall()
+    rows = itinerary.generate(legs, graph, dist_matrix, rng)
     with con:
-        run_script('query_loc_time.sql')
+        con.executemany('INSERT INTO loc_time VALUES (?, ?, ?, ?, ?, ?)', rows)
+        con.execute('''UPDATE table_version SET version = random(), changes = changes + ?
+                        WHERE table_name = ?''', (len(rows), 'loc_time'))
 
 
 def init_commonality_view() -> None:
-    """Initialize the view for victims' common attributes."""
+    """Initialize the counts of the victims' common attributes, maintained by a trigger, and their view."""
     with con:
         run_script('victim_common_attribute.sql')
 
@@ -338,6 +794,40 @@ def init_kill_trigger() -> None:
         run_script('kill_trigger.sql')
 
 
+def init_graph_version() -> None:
+    """Add the road graph version counters and the triggers maintaining them."""
+    with con:
+        run_script('graph_version.sql')
+
+
+def init_table_version() -> None:
+    """
+    Add the version of each saved table, and the triggers changing it along with the number of rows changed.
+
+    The version is random, so that the versions of diverging games, e.g. reloaded from the same save, do not match.
+    """
+    tables = [name for kind, name, _ in list_schema(con, 'main') if kind == 'table' and name not in CACHE_TABLES]
+    with con:
+        con.execute('''CREATE TABLE table_version(
+                           table_name TEXT NOT NULL,
+                           version    INTEGER NOT NULL,
+                           changes    INTEGER NOT NULL,
+                                      PRIMARY KEY(table_name)
+                       ) WITHOUT ROWID''')
+        for table in tables:
+            con.execute('INSERT INTO table_version VALUES (?, random(), 0)', (table,))
+            if table in REBUILT_TABLES:
+                continue
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                con.execute('''CREATE TRIGGER "table_version_{0}_{1}" AFTER {1} ON "{0}"
+                               BEGIN
+                                   UPDATE table_version SET version = random(), changes = changes + 1
+                                    WHERE table_name = '{0}';
+                               END'''.format(table, event))
+
+
+@writes
+@profiled
 def query_loc_time_inhabitant() -> None:
     """
     Insert the location-time tuples of all inhabitants into `loc_time`.
@@ -371,165 +861,350 @@ def query_loc_time_inhabitant() -> None:
     query_loc_time()
 
 
+@profiled
 def run_script(file_name: str) -> None:
-    """Execute the script file given the file name."""
-    with open(os.path.join(ROOT_DIR, file_name)) as fd:
-        script = fd.read()
+    """
+    Execute the script file given the file name in a single transaction.
+
+    The statements are taken from `SCRIPTS` and run one by one,
+    so that they are prepared once and then reused from the statement cache of the connection.
+    """
     with con:
-        con.executescript(script)
+        for statement in SCRIPTS[file_name]:
+            con.execute(statement)
 
 
-def query_inhabitant(income_lo: int = None, income_hi: int = None, occupation: str = None, gender: str = None, dead: bool = None, home_building_id: int = None, home_building_name: str = None, workplace_building_id: int = None, workplace_building_name: str = None, custody: bool = None, suspect: bool = None) -> Tuple[Tuple[str, ...], Tuple]:
-    """Query inhabitant given the user-specified predicate."""
-    global con
-    required_tables = ""
-    required_predicate = ""
-    if income_lo is not None or income_hi is not None \
-            or occupation is not None \
-            or workplace_building_id is not None or workplace_building_name is not None:
-        required_tables = "NATURAL JOIN workplace NATURAL JOIN occupation JOIN building AS w ON workplace_building_id = w.building_id"
-
-        if income_lo is not None:
-            required_predicate = required_predicate + " AND income >= " + str(income_lo)
-        if income_hi is not None:
-            required_predicate = required_predicate + " AND income <= " + str(income_hi)
-
-        if occupation is not None:
-            required_predicate = required_predicate + " AND occupation_name = '{0}'".format(occupation)
-
-    if gender is not None:
-        required_predicate = required_predicate + " AND gender = '{0}'".format(gender)
-
-    if dead is False:
-        required_predicate = required_predicate + " AND dead = 0"
-    elif dead is True:
-        required_predicate = required_predicate + " AND dead = 1"
-    if custody is False:
-        required_predicate = required_predicate + " AND custody = 0"
-    elif custody is True:
-        required_predicate = required_predicate + " AND custody = 0"
-
-    if home_building_id is not None:
-        required_predicate = required_predicate + " AND h.building_id = {0}".format(home_building_id)
-    if home_building_name is not None:
-        required_predicate = required_predicate + " AND h.building_name = '{0}'".format(home_building_name)
-    if workplace_building_id is not None:
-        required_predicate = required_predicate + " AND w.building_id = {0}".format(workplace_building_id)
-    if workplace_building_name is not None:
-        required_predicate = required_predicate + " AND w.building_name = '{0}'".format(workplace_building_name)
-
-    if suspect is True:
-        required_predicate = required_predicate + " AND EXISTS(SELECT * FROM suspect WHERE suspect.inhabitant_id = inhabitant.inhabitant_id)"
-    elif suspect is False:
-        required_predicate = required_predicate + " AND NOT EXISTS(SELECT * FROM suspect WHERE suspect.inhabitant_id = inhabitant.inhabitant_id)"
-
-    query = """ SELECT inhabitant_id, first_name, last_name, h.building_name, workplace_id, custody, dead, gender
-                  FROM inhabitant
-                       JOIN building AS h
-                       ON home_building_id = h.building_id """ + required_tables \
-            + '\nWHERE TRUE ' + required_predicate
-    # print(query)
-    cur = con.execute(query)
-    return ('inhabitant_id', 'first_name', 'last_name', 'home_building_name', 'workplace_id', 'custody', 'dead', 'gender'), \
-        cur.fetchall()
+# The columns of the rows returned by query_inhabitant(), by which they can be sorted.
+INHABITANT_COLUMNS = query.COLUMNS
 
 
-def query_inhabitant_detail(inhabitant_id: int) -> Tuple[Tuple[str, ...], Tuple]:
-    """Return the details for a given inhabitant."""
-    cur = con.execute('''SELECT inhabitant_id, first_name, last_name,
-                                custody, dead, gender,
-                                h.building_name, h.lockdown,
-                                w.building_name, w.lockdown,
-                                occupation_name, income,
-                                arrive_min, leave_min
-                           FROM inhabitant
-                                JOIN building AS h
-                                ON home_building_id = h.building_id
-                                JOIN workplace
-                                USING(workplace_id)
-                                JOIN building AS w
-                                ON workplace_building_id = w.building_id
-                                JOIN occupation
-                                USING(occupation_id)
-                          WHERE inhabitant_id = ?''',
-                      (inhabitant_id,))
-
-    return ('inhabitant_id', 'first_name', 'last_name',
-            'custody', 'dead', 'gender',
-            'home_building_name', 'home_lockdown',
-            'workplace_building_name', 'workplace_lockdown',
-            'occupation_name', 'income',
-            'arrive_min', 'leave_min'), \
-        cur.fetchone()
+def inhabitant_filter(income_lo: int = None, income_hi: int = None, occupation: str = None, gender: str = None, dead: bool = None, home_building_id: int = None, home_building_name: str = None, workplace_building_id: int = None, workplace_building_name: str = None, custody: bool = None, suspect: bool = None) -> Tuple[query.Shape, List[Any]]:
+    """Return the shape of the user-specified predicate and the values of its parameters, as taken by the queries of `query`."""
+    filters = dict(income_lo=income_lo, income_hi=income_hi, occupation=occupation, gender=gender, dead=dead,
+                   home_building_id=home_building_id, home_building_name=home_building_name,
+                   workplace_building_id=workplace_building_id, workplace_building_name=workplace_building_name,
+                   custody=custody)
+    filters = {name: value for name, value in filters.items() if value is not None}
+    if suspect is not None:
+        filters['suspect' if suspect else 'not_suspect'] = None
+    return query.bind(filters)
+
+
+@profiled
+def query_inhabitant(order_by: str = 'inhabitant_id', descending: bool = False, limit: int = None, offset: int = 0,
+                     **predicate: Any) -> Tuple[Tuple[str, ...], Tuple]:
+    """
+    Query inhabitant given the user-specified predicate, as taken by inhabitant_filter().
+
+    The rows are sorted by the column `order_by`, then by inhabitant_id, and only `limit` rows are returned
+    after skipping `offset` rows if a limit is given.
+    """
+    shape, parameters = inhabitant_filter(**predicate)
+    sql = query.select_inhabitant(shape, order_by, descending)
+    with db.reader() as read_con:
+        cur = read_con.execute(sql, parameters + [-1 if limit is None else limit, offset])
+        return INHABITANT_COLUMNS, cur.fetchall()
+
 
+@profiled
+def count_inhabitant(**predicate: Any) -> int:
+    """Return the number of inhabitants given the user-specified predicate, as taken by inhabitant_filter()."""
+    shape, parameters = inhabitant_filter(**predicate)
+    with db.reader() as read_con:
+        return read_con.execute(query.count_inhabitant(shape), parameters).fetchone()[0]
 
+
+@profiled
+def query_inhabitant_detail(inhabitant_id: int) -> Tuple[Tuple[str, ...], Tuple]:
+    """Return the details for a given inhabitant."""
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT inhabitant_id, first_name, last_name,
+                                         custody, dead, gender,
+                                         h.building_name, h.lockdown,
+                                         w.building_name, w.lockdown,
+                                         occupation_name, income,
+                                         arrive_min, leave_min
+                                    FROM inhabitant
+                                         JOIN building AS h
+                                         ON home_building_id = h.building_id
+                                         JOIN workplace
+                                         USING(workplace_id)
+                                         JOIN building AS w
+                                         ON workplace_building_id = w.building_id
+                                         JOIN occupation
+                                         USING(occupation_id)
+                                   WHERE inhabitant_id = ?''',
+                               (inhabitant_id,))
+
+        return ('inhabitant_id', 'first_name', 'last_name',
+                'custody', 'dead', 'gender',
+                'home_building_name', 'home_lockdown',
+                'workplace_building_name', 'workplace_lockdown',
+                'occupation_name', 'income',
+                'arrive_min', 'leave_min'), \
+            cur.fetchone()
+
+
+@profiled
 def query_via_point_constraint(start: int, end: int, mins: int) -> List[Tuple[int]]:
     """
     List all the vertices v where the path start -> v -> end is not longer than mins.
 
-    query_shortest_path() must be run before calling this function.
+    `dist` is built first if it has not been since the game was loaded.
     """
-    cur = con.execute('''SELECT a.dst
-                           FROM dist AS a
-                                JOIN dist AS b
-                                ON a.dst = b.src
-                          WHERE a.src = ? AND b.dst = ? AND a.d + b.d <= ?''',
-                      (start, end, mins))
-    return cur.fetchall()
+    if dist_matrix is None:
+        query_shortest_path()
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT a.dst
+                                    FROM dist AS a
+                                         JOIN dist AS b
+                                         ON a.dst = b.src
+                                   WHERE a.src = ? AND b.dst = ? AND a.d + b.d <= ?''',
+                               (start, end, mins))
+        return cur.fetchall()
+
 
+# The columns of the rows returned by query_witness_count(), by which they can be sorted.
+WITNESS_COLUMNS = ('inhabitant_id', 'first_name', 'last_name', 'count')
 
-def query_witness_count(vertex_id: int) -> List[Tuple[str, str, int]]:
+
+@profiled
+def query_witness_count(vertex_id: int, order_by: str = 'count', descending: bool = True, limit: int = None,
+                        offset: int = 0) -> List[Tuple[int, str, str, int]]:
     """
     List the name and the number of times that each inhabitant has been seen in a vertex.
 
-    query_loc_time() must be run before calling this function.
-    """
-
-    cur = con.execute('''SELECT a.inhabitant_id, MIN(a_info.first_name), MIN(a_info.last_name),
-                                COUNT(b.inhabitant_id) AS c
-                           FROM loc_time AS a
-                                JOIN inhabitant AS a_info
-                                ON a_info.inhabitant_id = a.inhabitant_id
-                                JOIN loc_time AS b
-                                ON a.inhabitant_id <> b.inhabitant_id
-                                   AND a.vertex_id = b.vertex_id
-                                   AND ((a.arrive <= b.arrive AND b.arrive <= a.leave)
-                                        OR (a.arrive <= b.leave AND b.leave <= a.leave))
-                                   AND (a_info.dead = FALSE OR a.arrive
-                                       <= (SELECT MIN(min_of_death) FROM victim WHERE victim_id = a.inhabitant_id))
-                                   AND b_info.dead = FALSE
-                                JOIN inhabitant AS b_info
-                                ON b_info.inhabitant_id = b.inhabitant_id
-                          WHERE a.vertex_id = ?
-                       GROUP BY a.inhabitant_id
-                       ORDER BY c DESC''',
-                      (vertex_id,))
-    return cur.fetchall()
+    The rows are sorted by the column `order_by`, then by inhabitant_id, and only `limit` rows are returned
+    after skipping `offset` rows if a limit is given.
+    query_witness_count_table() must be run before calling this function.
+    """
+    if order_by not in WITNESS_COLUMNS:
+        raise ValueError('Cannot sort the witness counts by {0}'.format(order_by))
+    with db.reader() as read_con:
+        cur = read_con.execute('''SELECT inhabitant_id, first_name, last_name, count
+                                    FROM witness_count
+                                         JOIN inhabitant
+                                         USING(inhabitant_id)
+                                   WHERE vertex_id = ?
+                                ORDER BY {0} {1}, inhabitant_id
+                                   LIMIT ? OFFSET ?'''.format(order_by, 'DESC' if descending else 'ASC'),
+                               (vertex_id, -1 if limit is None else limit, offset))
+        return cur.fetchall()
+
+
+@profiled
+def count_witness(vertex_id: int) -> int:
+    """Return the number of inhabitants that have been seen in a vertex."""
+    with db.reader() as read_con:
+        return read_con.execute('SELECT COUNT(*) FROM witness_count WHERE vertex_id = ?', (vertex_id,)).fetchone()[0]
+
+
+@writes
+@profiled
+def query_witness_count_table() -> None:
+    """
+    Precompute the witness counts of all inhabitants in all vertices into `witness_count`.
+
+    query_loc_time() must be run before calling this function, and it must be run again after someone is killed.
+    """
+    # An inhabitant who cannot reach the destination in time never leaves, and is seen until the end of the day.
+    visits = np.array(con.execute('''SELECT inhabitant_id, vertex_id, arrive, COALESCE(leave, ?)
+                                        FROM loc_time''', (witness.DAY_END,)).fetchall(), dtype=np.int64)
+
+    n = con.execute('SELECT MAX(inhabitant_id) + 1 FROM inhabitant').fetchone()[0]
+    dead = np.zeros(n, dtype=bool)
+    dead[[r[0] for r in con.execute('SELECT inhabitant_id FROM inhabitant WHERE dead = TRUE')]] = True
+    min_of_death = np.full(n, -1, dtype=np.int64)
+    for victim_id, m in con.execute('SELECT victim_id, min_of_death FROM victim'):
+        min_of_death[victim_id] = m
 
+    with con:
+        con.execute('DELETE FROM witness_count')
+        con.executemany('INSERT INTO witness_count VALUES (?, ?, ?)', witness.count(visits, dead, min_of_death))
 
+
+@profiled
 def query_victim_commonality() -> List[Tuple]:
     """List the common attributes among victims."""
-    cur = con.execute("SELECT * FROM commonality")
-    return cur.fetchall()
+    with db.reader() as read_con:
+        cur = read_con.execute("SELECT * FROM commonality")
+        return cur.fetchall()
+
+
+def init_victim_scores() -> None:
+    """Build the feature matrix of the inhabitants and score them as potential victims of each killer."""
+    global killers
+    global features
+    global victim_scores
+    global killer_pool
+    killers = con.execute('SELECT killer_id, killer_inhabitant_id FROM killer ORDER BY killer_id').fetchall()
+    features = victim.feature_matrix(con)
+    victim_scores = victim.score_matrix(con, features, killers)
+
+    # Starting the workers takes longer than ranking a single killer, so the pool is only used for several killers.
+    shutdown_killer_pool()
+    workers = min(len(killers), os.cpu_count() or 1)
+    if workers > 1:
+        killer_pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def shutdown_killer_pool() -> None:
+    """Stop the worker processes ranking the potential victims, if any."""
+    global killer_pool
+    if killer_pool is not None:
+        killer_pool.shutdown()
+        killer_pool = None
+
+
+@profiled
+def select_victim() -> List[Tuple]:
+    """Select at most one victim for each killer, returning the `(inhabitant_id, scene_vertex_id, min_of_death, weight_sum)` tuples."""
+    # An inhabitant who cannot reach the destination in time never leaves, and is seen until the end of the day.
+    visits = np.array(con.execute('''SELECT inhabitant_id, vertex_id, arrive, COALESCE(leave, ?)
+                                        FROM loc_time''', (witness.DAY_END,)).fetchall(), dtype=np.int64)
+    victims = victim.select(victim.snapshot(visits), killers, victim_scores, rng, killer_pool)
+    return [v for v in victims if v is not None]
+
+
+def get_turn_state() -> Dict[str, Any]:
+    """Return the globals that a turn reads and changes, with the state of the random number generator."""
+    state = {name: globals()[name] for name in TURN_STATE}
+    state['rng'] = rng.bit_generator.state
+    return state
+
+
+def set_turn_state(state: Dict[str, Any]) -> None:
+    """Restore the globals returned by get_turn_state()."""
+    global rng
+    globals().update((name, state[name]) for name in TURN_STATE)
+    rng = np.random.default_rng()
+    rng.bit_generator.state = state['rng']
+
+
+def set_speculation(enabled: bool) -> None:
+    """
+    Turn the computation of the next day in advance on or off.
 
+    The day is computed in a worker process on a copy of the game state, so that it competes neither for the
+    database locks nor for the interpreter lock with the UI, and it is discarded if the game state changes meanwhile.
+    """
+    global speculating
+    global speculation_executor
+    global latest_speculation
+    speculating = enabled
+    if enabled and speculation_executor is None:
+        context = multiprocessing.get_context('spawn')
+        latest_speculation = context.Value('q', speculation_token)
+        speculation_executor = concurrent.futures.ProcessPoolExecutor(1, mp_context=context, initializer=init_speculation_worker,
+                                                                      initargs=(latest_speculation,))
+    elif not enabled and speculation_executor is not None:
+        supersede_speculation()
+        speculation_executor.shutdown(cancel_futures=True)
+        speculation_executor = None
+        latest_speculation = None
+
+
+def init_speculation_worker(latest: Any) -> None:
+    """Keep the shared token of the latest speculation in the worker process."""
+    global latest_speculation
+    latest_speculation = latest
+
+
+def supersede_speculation() -> None:
+    """
+    Make the speculations started so far stale.
 
-def select_victim() -> Tuple:
-    """Select a single victim."""
-    with open(os.path.join(ROOT_DIR, "kill_sequence.sql")) as fd:
-        script = fd.read()
-    con.executescript(script)
+    A speculation that has not started is cancelled, and one being computed stops at the beginning of its next phase,
+    so that a newer speculation or the turn computed now does not wait for it.
+    """
+    global speculation
+    global speculation_token
+    if speculation is not None:
+        speculation.cancel()
+    speculation = None
+    speculation_token += 1
+    if latest_speculation is not None:
+        latest_speculation.value = speculation_token
 
-    # The following query outputs one tuple containing information of the selected victim:
-    # inhabitant_id, scene_vertex_id, min_of_death, weighted_sum (killer characteristics fulfilled)
-    cur = con.execute('''
-        SELECT pot_victim.inhabitant_id, pot_victim.vertex_id AS scene_vertex_id, (ABS(RANDOM())%(end_min-start_min) + start_min) AS min_of_death, weight_sum
-        FROM (SELECT inhabitant_id, vertex_id, sum(chara_weight) AS weight_sum
-            FROM weighed_pot_victim
-            GROUP BY inhabitant_id, vertex_id) AS sub, pot_victim
-        WHERE sub.inhabitant_id = pot_victim.inhabitant_id AND
-                sub.vertex_id = pot_victim.vertex_id AND
-                ABS(RANDOM())%(end_min-start_min) + start_min IS NOT NULL
-        ORDER BY weight_sum DESC
-        LIMIT 1;
-    ''')
-    return cur.fetchone()
+
+def speculate() -> None:
+    """
+    Start computing the next day in advance from the game state, replacing any previous speculation.
+
+    The game state is copied once the calling writer, if any, has exited, so it may be called from within a writer.
+    """
+    global speculation
+    if not speculating:
+        return
+    supersede_speculation()
+    speculation = speculation_thread.submit(run_speculation, speculation_token)
+
+
+def run_speculation(token: int) -> Tuple[int, bytes, Dict[str, Any]]:
+    """
+    Copy the game state, unless a newer speculation has started, and compute the next day from it in the worker.
+
+    The copy is only taken after SPECULATION_DELAY, in case a newer speculation starts meanwhile.
+    """
+    time.sleep(SPECULATION_DELAY)
+    with db.reader():
+        if token != speculation_token or db.con is None:
+            return None
+        data, generation = db.serialize()
+        state = get_turn_state()
+    data, state = speculation_executor.submit(speculate_next_day, data, state, token).result()
+    return generation, data, state
+
+
+def speculate_next_day(data: bytes, state: Dict[str, Any], token: int) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Compute the next day from the serialized game state and turn state, and return them after the day.
+
+    Raise TurnCancelled at the beginning of a phase if a newer speculation than `token` has started meanwhile.
+    """
+    def report(phase: str, fraction: float) -> None:
+        if latest_speculation.value != token:
+            raise TurnCancelled()
+
+    db.open()
+    try:
+        with db.writer():
+            db.load(data)
+            set_turn_state(state)
+            compute_next_day(report)
+        return db.serialize()[0], get_turn_state()
+    finally:
+        db.close()
+
+
+def commit_speculation() -> bool:
+    """
+    Replace the game state with the next day computed in advance.
+
+    Return False if there is no such day, if it is stale as the game state has changed since it started,
+    or if it is not done yet, in which case it is superseded, as computing the day now is faster than waiting for it
+    behind any stale speculation still running.
+    """
+    global speculation
+    future = speculation
+    # A writer would never let the speculation copy the game state.
+    if future is None or db.writer_thread == threading.get_ident():
+        return False
+    if not future.done():
+        supersede_speculation()
+        return False
+    speculation = None
+    try:
+        result = future.result()
+    except Exception:
+        return False
+    if result is None:
+        return False
+
+    generation, data, state = result
+    with db.writer():
+        if db.generation != generation:
+            return False
+        db.load(data)
+        set_turn_state(state)
+    return True
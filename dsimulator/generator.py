@@ -4,29 +4,65 @@ import sqlite3
 import numpy as np
 import random
 from faker import Faker
+from typing import Callable, Iterator, Set, Tuple
 
 np.random.seed(0)
 
 
 NUM_INHABITANTS = 1000
+# The buildings placed by generate_home() for each of the 3 income ranges and by generate_workplace() by default,
+# each on its own vertex of the map.
+HOMES_PER_RANGE = 2
+NUM_WORKPLACE_BUILDINGS = 30
+NUM_BUILDINGS = 3 * HOMES_PER_RANGE + NUM_WORKPLACE_BUILDINGS
 GENDERS = ['m', 'f']
 CUSTODY_VALUES = [0, 1]
 DEAD_VALUES = [0, 1]
+KILLER_CHARA = ['low income', 'high income', 'neighbor', 'rapist', 'colleague', 'Relative']
 fk = Faker('en_US')  # use english names as this shall be an American town
 
 
-def get_free_vertex(con: sqlite3.Connection) -> int:
-    """Return a random vertex without a building."""
-    cur = con.execute('''SELECT vertex_id
-                           FROM vertex
-                          WHERE NOT EXISTS (SELECT * FROM building WHERE building_id = vertex_id)
-                       ORDER BY RANDOM()
-                          LIMIT 1''')
-    return cur.fetchone()[0]
+def seed(seed: int) -> None:
+    """Seed the random number generators used for generating the world."""
+    random.seed(seed)
+    fk.seed_instance(seed)
 
 
-def generate_home(con: sqlite3.Connection, building_per_range: int = 2) -> None:
+class BuildingAllocator:
+    """
+    Hand out the vertices and names for new buildings.
+
+    The free vertices are shuffled once and popped one at a time,
+    and the names in use are kept in a set, so placing each building takes constant time.
+    """
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        """Collect the vertices without a building and the building names in use."""
+        self.free_vertices = [r[0] for r in con.execute('''SELECT vertex_id
+                                                              FROM vertex
+                                                             WHERE NOT EXISTS (SELECT * FROM building WHERE building_id = vertex_id)''')]
+        random.shuffle(self.free_vertices)
+        self.names = {r[0] for r in con.execute('SELECT building_name FROM building')}
+
+    def vertex(self) -> int:
+        """Return a random vertex without a building, or raise ValueError if every vertex has one."""
+        if not self.free_vertices:
+            raise ValueError('The map has no vertex left for another building')
+        return self.free_vertices.pop()
+
+    def name(self, make_name: Callable[[], str]) -> str:
+        """Return a building name generated by `make_name` that is not used by another building."""
+        name = make_name()
+        while name in self.names:
+            name = make_name()
+        self.names.add(name)
+        return name
+
+
+def generate_home(con: sqlite3.Connection, building_per_range: int = HOMES_PER_RANGE, allocator: BuildingAllocator = None) -> None:
     """Generate the homes and income ranges given the database connection containing vertices."""
+    if allocator is None:
+        allocator = BuildingAllocator(con)
     income_name = ['Low Income Home', 'Medium Income Home', 'High Income Home']
     income = [(1, 30000), (30000, 90000), (90000, None)]  # [1,3000), [3000,90000), [90000,inf) this was the bug from previous meeting
     with con:
@@ -35,15 +71,20 @@ def generate_home(con: sqlite3.Connection, building_per_range: int = 2) -> None:
             income_level = cur.lastrowid
 
             for i in range(building_per_range):
-                home_building_id = get_free_vertex(con)
+                home_building_id = allocator.vertex()
+                building_name = n + ' ' + str(i + 1)
+                allocator.names.add(building_name)
                 con.execute('INSERT INTO building (building_id, building_name, lockdown) VALUES (?, ?, ?)',
-                            (home_building_id, n + ' ' + str(i + 1), 0))
+                            (home_building_id, building_name, 0))
                 con.execute('INSERT INTO home (home_building_id, income_level) VALUES (?, ?)',
                             (home_building_id, income_level))
 
 
-def generate_workplace(con: sqlite3.Connection, num_occupation: int = 30, num_building: int = 30, occupation_per_building: int = 3) -> None:
+def generate_workplace(con: sqlite3.Connection, num_occupation: int = 30, num_building: int = NUM_WORKPLACE_BUILDINGS, occupation_per_building: int = 3,
+                       allocator: BuildingAllocator = None) -> None:
     """Generate the workplaces (occupations and buildings) given the database connection containing vertices."""
+    if allocator is None:
+        allocator = BuildingAllocator(con)
     with con:
         # Generate the occupations.
         for _ in range(num_occupation):
@@ -54,71 +95,61 @@ def generate_workplace(con: sqlite3.Connection, num_occupation: int = 30, num_bu
             con.execute('INSERT INTO occupation (occupation_name, income, arrive_min, leave_min) VALUES (?, ?, ?, ?)',
                         (occupation_name, income, arrive_min, leave_min))
 
+        occupation_ids = [r[0] for r in con.execute('SELECT occupation_id FROM occupation ORDER BY occupation_id')]
+
         # Generate the working buildings.
         for _ in range(num_building):
-            building_id = get_free_vertex(con)
+            building_id = allocator.vertex()
 
             # Use a company name as the name of the building.
-            building_name = fk.company()
-            while True:
-                cur = con.execute('SELECT COUNT(*) FROM building WHERE building_name = ?', (building_name,))
-                if cur.fetchone()[0] == 0:
-                    break
-                building_name = fk.company()
+            building_name = allocator.name(fk.company)
 
             con.execute('INSERT INTO building (building_id, building_name, lockdown) VALUES (?, ?, ?)',
                         (building_id, building_name, 0))
 
             # Connect buildings with occupations.
-            con.execute('''INSERT INTO workplace (workplace_building_id, occupation_id)
-                               SELECT ?, occupation_id
-                                 FROM occupation
-                             ORDER BY RANDOM()
-                                LIMIT ?''',
-                        (building_id, occupation_per_building))
+            # The occupations are chosen with `random` rather than ORDER BY RANDOM() so that seed() applies.
+            occupations = random.sample(occupation_ids, min(occupation_per_building, len(occupation_ids)))
+            con.executemany('INSERT INTO workplace (workplace_building_id, occupation_id) VALUES (?, ?)',
+                            [(building_id, o) for o in occupations])
 
 
-def generate_inhabitants_and_relationships(con: sqlite3.Connection, num_inhab: int = 1000) -> None:
-    """Generate inhabitants and relationships."""
+def generate_inhabitants_and_relationships(con: sqlite3.Connection, num_inhab: int = NUM_INHABITANTS) -> int:
+    """
+    Generate inhabitants and relationships, and return the inhabitant_id of the killer.
+
+    The inhabitants are grouped by last name and workplace in dictionaries, so that the relationships
+    can be generated without scanning all the other inhabitants, and everything is inserted in one transaction.
+    """
     template_inhabitant = "INSERT INTO inhabitant VALUES (?, ?, ?, ?, ?, ?, 0, 0, ?);"
     template_relationship = "INSERT INTO relationship VALUES (?, ?, ?);"
     # Get workplace data
-    workplace_list = con.execute("SELECT * FROM workplace").fetchall()
+    workplace_list = con.execute("SELECT workplace_id, occupation_id FROM workplace").fetchall()
+
+    # The homes matching the income of each occupation
+    occupation_home = {}
+    for occupation, home in con.execute('''
+            SELECT occupation_id, home_building_id
+            FROM occupation, income_range JOIN home USING (income_level)
+            WHERE income >= low AND (income < high OR high IS NULL)'''):
+        occupation_home.setdefault(occupation, []).append(home)
 
     # Generate inhabitants
     inhabitants = []
+    family = {}
+    colleague = {}
     for i in range(num_inhab - 1):
         gender = 'm' if random.uniform(0, 1) < 0.5 else 'f'
         first_name = fk.first_name_male() if gender == 'm' else fk.first_name_female()
         last_name = fk.last_name()
 
-        # Randomly select a workplace tuple
-        workplace = random.choice(workplace_list)
-        work = workplace[0]  # workplace_id
-        occupation = workplace[2]  # occupation_id
+        # Randomly select a workplace tuple and a home matching its income
+        work, occupation = random.choice(workplace_list)
+        h_build = random.choice(occupation_home[occupation])
 
-        # Query for the equivalent home building, occupation, and income_range
-        h_build = con.execute('''
-            SELECT home_building_id
-            FROM occupation, income_range JOIN home USING (income_level)
-            WHERE income >= low AND (income < high OR high IS NULL) AND
-                occupation_id = ?
-            ORDER BY random()
-        ''', (occupation,)).fetchone()[0]
-
-        # Insert inhabitant into the database
-        with con:
-            con.execute(template_inhabitant, (i, first_name, last_name, h_build, h_build, work, gender))
-
-        # Save inhabitant details for later relationship generation
-        inhabitants.append({
-            'id': i,
-            'gender': gender,
-            'first_name': first_name,
-            'last_name': last_name,
-            'home_building': h_build,
-            'workplace_id': work
-        })
+        inhabitants.append((i, first_name, last_name, h_build, h_build, work, gender))
+        family.setdefault(last_name, []).append(i)
+        colleague.setdefault(work, []).append(i)
 
     # Set an inhabitant with attributes matching the character of the killer
     killer_info = con.execute('''
@@ -126,104 +157,118 @@ def generate_inhabitants_and_relationships(con: sqlite3.Connection, num_inhab: i
         FROM workplace JOIN occupation USING(occupation_id), income_range JOIN home USING(income_level)
         WHERE income >= low AND (income < high OR high IS NULL)
     ''').fetchone()
+    killer_id = num_inhab - 1
+    inhabitants.append((killer_id, "Light", "Yagami", killer_info[0], killer_info[0], killer_info[1], 'm'))
+
+    # Everyone but the killer has an enemy and a friend among the others outside of the family.
+    if num_inhab - 1 - max(map(len, family.values()), default=0) < 2:
+        raise ValueError('{0} inhabitants are too few for everyone to have an enemy and a friend'.format(num_inhab))
+
+    def relationships() -> Iterator[Tuple[int, int, str]]:
+        """Generate the relationships of all inhabitants but the killer, based on common sense."""
+        for i, _, last_name, _, _, work, _ in inhabitants[:-1]:
+            # Related inhabitants based on last name
+            excluded = set(family[last_name])
+            for relative in family[last_name]:
+                if relative != i:
+                    yield i, relative, "Relative"
+
+            enemy = random_other(len(inhabitants) - 1, excluded)
+            excluded.add(enemy)
+            yield i, enemy, "Enemy"
+
+            friend = random_other(len(inhabitants) - 1, excluded)
+            excluded.add(friend)
+            yield i, friend, "Friend"
+
+            for other in colleague[work]:
+                if other not in excluded:
+                    yield i, other, "Colleague"
+
+    with con:
+        con.executemany(template_inhabitant, inhabitants)
+        con.executemany(template_relationship, relationships())
+
+    return killer_id
+
+
+def random_other(n: int, excluded: Set[int]) -> int:
+    """
+    Return a random integer in [0, n) that is not in `excluded`, or raise ValueError if there is none.
+
+    A random rank is drawn among the remaining integers, then shifted past the excluded ones below it.
+    """
+    excluded = sorted(e for e in excluded if 0 <= e < n)
+    if len(excluded) >= n:
+        raise ValueError('All the integers in [0, {0}) are excluded'.format(n))
+    other = random.randrange(n - len(excluded))
+    for e in excluded:
+        if e > other:
+            break
+        other += 1
+    return other
+
+
+def generate_map(con: sqlite3.Connection, width: int = 10, height: int = 10, rng: np.random.Generator = None) -> None:
+    """
+    Insert a random-generated grid map of the given size into the database.
+
+    Neighboring vertices on the grid are connected in both directions with the same random cost.
+    In addition, some vertices are connected to a diagonal neighbor on the next row in a random direction.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    y, x = np.divmod(np.arange(width * height), width)
+    vertex_id = y * width + x
+
+    # Vertical and horizontal edges, added twice for two directions.
+    down = vertex_id[y < height - 1]
+    right = vertex_id[x < width - 1]
+    start = np.concatenate([down, right])
+    end = np.concatenate([down + width, right + 1])
+    cost = rng.integers(10, 21, len(start))
+    start, end, cost = np.concatenate([start, end]), np.concatenate([end, start]), np.concatenate([cost, cost])
+
+    # Diagonal edges, starting at a random column in each row and skipping 1 to 3 columns each time.
+    diag_x = np.cumsum(rng.integers(1, 4, (height - 1, width)), axis=1)
+    diag_y = np.broadcast_to(np.arange(height - 1)[:, None], diag_x.shape)
+    diag = diag_x < width
+    diag_x, diag_y = diag_x[diag], diag_y[diag]
+    side = np.where(diag_x == width - 1, -1, rng.choice([-1, 1], len(diag_x)))
+    upper = diag_y * width + diag_x
+    lower = (diag_y + 1) * width + diag_x + side
+    up = rng.integers(0, 2, len(diag_x)) == 1
+    start = np.concatenate([start, np.where(up, lower, upper)])
+    end = np.concatenate([end, np.where(up, upper, lower)])
+    cost = np.concatenate([cost, rng.integers(10, 21, len(diag_x))])
 
-    # Insert killer inhabitant
     with con:
-        # killer_info['home_building_id'], killer_info['home_building_id'], killer_info['workplace_id']
-        con.execute(template_inhabitant, (num_inhab - 1, "Light", "Yagami", killer_info[0],
-                                          killer_info[0], killer_info[1], 'm'))
-
-    # Generate relationships between inhabitants
-    for inhabitant in inhabitants:
-        # Consistent relationships based on common sense
-        different_inhabitants = [other for other in inhabitants if other['id'] != inhabitant['id']]
-        # Get random relationship type
-        # relationship_type = random.choice(["Relative", "Friend", "Enemy", "Colleague"])
-
-        # Get a related inhabitant based on gender and last name
-        related = [
-            other for other in different_inhabitants if
-            other['last_name'] == inhabitant['last_name']
-        ]
-        with con:
-            for relative in related:
-                con.execute(template_relationship, (inhabitant['id'], relative['id'], "Relative"))
-                different_inhabitants.remove(relative)
-
-        enemy = random.choice(different_inhabitants)
-        different_inhabitants.remove(enemy)
-        with con:
-            con.execute(template_relationship, (inhabitant['id'], enemy['id'], "Enemy"))
-
-        friend = random.choice(different_inhabitants)
-        different_inhabitants.remove(friend)
-        with con:
-            con.execute(template_relationship, (inhabitant['id'], friend['id'], "Friend"))
-
-        colleagues = [
-            other for other in different_inhabitants if
-            other['workplace_id'] == inhabitant['workplace_id']
-        ]
-
-        for colleague in colleagues:
-            with con:
-                con.execute(template_relationship, (inhabitant['id'], colleague['id'], "Colleague"))
-
-
-def generate_map(con: sqlite3.Connection) -> None:
-    """Return a query that inserts a random-generated map into the database."""
-    result = ''
-    for y in range(10):
-        for x in range(10):
-            result = result + 'INSERT INTO vertex VALUES({0}, {1}, {2});\n'.format(y * 10 + x, x, y)
-
-    template = 'INSERT INTO edge VALUES({0}, {1}, {2});\n'
-    for y in range(10):
-        for x in range(10):
-            y_temp = random.randint(10, 20)
-            x_temp = random.randint(10, 20)
-            if y != 9:
-                result = result + template.format(y * 10 + x, (y + 1) * 10 + x, y_temp)
-                result = result + template.format((y + 1) * 10 + x, y * 10 + x, y_temp)
-            if x != 9:
-                result = result + template.format(y * 10 + x, y * 10 + x + 1, x_temp)
-                result = result + template.format(y * 10 + x + 1, y * 10 + x, x_temp)
-
-    for y in range(9):
-        x = random.randint(1, 3)
-        while x < 10:
-            up_or_down = random.randint(0, 1)
-            if x == 0:
-                if up_or_down == 0:
-                    result = result + template.format(y * 10 + x, (y + 1) * 10 + x + 1, random.randint(10, 20))
-                else:
-                    result = result + template.format((y + 1) * 10 + x + 1, y * 10 + x, random.randint(10, 20))
-            elif x == 9:
-                if up_or_down == 0:
-                    result = result + template.format(y * 10 + x, (y + 1) * 10 + x - 1, random.randint(10, 20))
-                else:
-                    result = result + template.format((y + 1) * 10 + x - 1, y * 10 + x, random.randint(10, 20))
-            else:
-                if up_or_down == 0:
-                    result = result + template.format(y * 10 + x, (y + 1) * 10 + x + random.choice([-1, 1]), random.randint(10, 20))
-                else:
-                    result = result + template.format((y + 1) * 10 + x + random.choice([-1, 1]), y * 10 + x, random.randint(10, 20))
-            x = x + random.randint(1, 3)
-
-    for insert_statement in result.split(';'):
-        con.execute(insert_statement)
-
-
-def generate_test_killer(con: sqlite3.Connection) -> None:
-    """Generate only one killer for testing purposes."""
-    con.execute("INSERT INTO killer VALUES(0)")
-    template = "INSERT INTO killer_chara VALUES(0, ?, ?)"
-    con.execute(template, ("rapist", 15))
-    con.execute(template, ("high income", 5))
-    con.execute(template, ("colleague", 10))
+        con.executemany('INSERT INTO vertex VALUES (?, ?, ?)', zip(vertex_id.tolist(), x.tolist(), y.tolist()))
+        con.executemany('INSERT INTO edge VALUES (?, ?, ?)', zip(start.tolist(), end.tolist(), cost.tolist()))
+
+
+def generate_test_killer(con: sqlite3.Connection, killer_inhabitant_id: int, num_killers: int = 1) -> None:
+    """
+    Generate the killers for testing purposes.
+
+    The first killer is the given inhabitant and always has the same characteristics.
+    The others are random inhabitants with random characteristics.
+    """
+    others = [r[0] for r in con.execute('SELECT inhabitant_id FROM inhabitant WHERE inhabitant_id <> ? ORDER BY inhabitant_id',
+                                        (killer_inhabitant_id,))]
+    killer_inhabitant_ids = [killer_inhabitant_id] + random.sample(others, num_killers - 1)
+
+    template = "INSERT INTO killer_chara VALUES(?, ?, ?)"
+    for killer_id, inhabitant_id in enumerate(killer_inhabitant_ids):
+        con.execute("INSERT INTO killer VALUES(?, ?)", (killer_id, inhabitant_id))
+        if killer_id == 0:
+            chara = [("rapist", 15), ("high income", 5), ("colleague", 10)]
+        else:
+            chara = [(c, random.randint(1, 4) * 5) for c in random.sample(KILLER_CHARA, random.randint(1, 3))]
+        con.executemany(template, [(killer_id, c, w) for c, w in chara])
 
 
 def init_status(con: sqlite3.Connection) -> None:
     """Initialize status to constant for tests."""
     # resignation day is set to 15 for now
-    con.execute("INSERT INTO status VALUES(0, 1, 15, 0, 999)")
+    con.execute("INSERT INTO status VALUES(0, 1, 15)")
@@ -0,0 +1,47 @@
+/*
+Version counters of the road graph, bumped by triggers whenever it changes.
+`dist` only has to be recomputed when these differ from the versions it was built from.
+Lockdown changes are counted separately since they can be applied incrementally.
+*/
+
+CREATE TABLE graph_version(
+	single   INTEGER DEFAULT 0 NOT NULL CHECK(single = 0),
+	lockdown INTEGER DEFAULT 0 NOT NULL,
+	edge     INTEGER DEFAULT 0 NOT NULL,
+	         PRIMARY KEY(single)
+) WITHOUT ROWID;
+
+INSERT INTO graph_version DEFAULT VALUES;
+
+CREATE TRIGGER graph_version_lockdown AFTER UPDATE OF lockdown ON building
+WHEN OLD.lockdown <> NEW.lockdown
+BEGIN
+	UPDATE graph_version SET lockdown = lockdown + 1;
+END;
+
+CREATE TRIGGER graph_version_building_insert AFTER INSERT ON building
+WHEN NEW.lockdown
+BEGIN
+	UPDATE graph_version SET lockdown = lockdown + 1;
+END;
+
+CREATE TRIGGER graph_version_building_delete AFTER DELETE ON building
+WHEN OLD.lockdown
+BEGIN
+	UPDATE graph_version SET lockdown = lockdown + 1;
+END;
+
+CREATE TRIGGER graph_version_edge_insert AFTER INSERT ON edge
+BEGIN
+	UPDATE graph_version SET edge = edge + 1;
+END;
+
+CREATE TRIGGER graph_version_edge_update AFTER UPDATE ON edge
+BEGIN
+	UPDATE graph_version SET edge = edge + 1;
+END;
+
+CREATE TRIGGER graph_version_edge_delete AFTER DELETE ON edge
+BEGIN
+	UPDATE graph_version SET edge = edge + 1;
+END;
@@ -1,20 +1,12 @@
 /*
-Inhabitant random path generation algorithm via recursive trigger.
-Given the time that the inhabitant MAY leave the source vertex (e.g. get up at home)
-and the time that the inhabitant MUST arrive at the destination vertex (e.g. class begins at school),
-find a random path that satisfies this time constraint and stops for random durations
-in the vertices in between (including the source and the destination).
+Tables for the inhabitant random path generation.
+The constraints should be added into the src_dst first,
+then the paths are generated by itinerary.py and inserted into loc_time.
 
-It it very hard to implement in recursive CTE due to the difficulty of RANDOMLY
-selecting a SINGLE edge in each step.
-(Note that you cannot use LIMIT as it behaves differently in recursive CTE.)
-
-The constraints should be added into the src_dst first.
+The tables are created once and emptied at the beginning of each day.
 */
 
-DROP TABLE IF EXISTS src_dst;
-
-CREATE TABLE src_dst(
+CREATE TABLE IF NOT EXISTS src_dst(
 	inhabitant_id INTEGER NOT NULL,
 	src           INTEGER NOT NULL,
 	dst           INTEGER NOT NULL,
@@ -23,10 +15,8 @@ CREATE TABLE src_dst(
 	              PRIMARY KEY(inhabitant_id, src, dst)
 );
 
-DROP TABLE IF EXISTS loc_time;
-
 -- Indicate that an inhabitant arrives and leaves at a certain vertex at certain times.
-CREATE TABLE loc_time(
+CREATE TABLE IF NOT EXISTS loc_time(
 	inhabitant_id INTEGER NOT NULL,
 	vertex_id     INTEGER NOT NULL,
 	arrive        INTEGER NOT NULL,
@@ -37,27 +27,14 @@ CREATE TABLE loc_time(
 	              PRIMARY KEY(inhabitant_id, vertex_id, arrive)
 );
 
--- Called each time a new location-time decision is made and thus inserted into the table.
-CREATE TRIGGER insert_loc_time AFTER INSERT ON loc_time
-WHEN
-	-- Stop when the destination is reached.
-	NEW.vertex_id <> NEW.dst
-BEGIN
-	-- Traverse one edge and wait at the neighboring vertex for a random amount of time,
-	-- such that the current time, plus the time to traverse the edge,
-	-- plus the shortest time to go from the neighboring vertex to the destination,
-	-- and plus the random waiting time does not exceed the constraint.
-	-- Then randomly choose one plausible edge to go through.
-	INSERT INTO loc_time
-		  SELECT NEW.inhabitant_id, end, NEW.leave + cost_min,
-		         NEW.leave + cost_min + ABS(RANDOM()) % (NEW.t_dst - (NEW.leave + cost_min) + 1
-		         - (SELECT MIN(d) FROM dist WHERE dist.src = end AND dist.dst = NEW.dst)),
-			     NEW.dst, NEW.t_dst
-		    FROM edge
-		   WHERE start = NEW.vertex_id
-		         AND NEW.leave + cost_min +
-		         (SELECT MIN(d) FROM dist WHERE dist.src = end AND dist.dst = NEW.dst)
-		         <= NEW.t_dst
-		ORDER BY RANDOM()
-		   LIMIT 1;
-END;
+-- The number of times that each inhabitant has been seen in a vertex, precomputed by witness.py once per day.
+CREATE TABLE IF NOT EXISTS witness_count(
+	vertex_id     INTEGER NOT NULL,
+	inhabitant_id INTEGER NOT NULL,
+	count         INTEGER NOT NULL,
+	              PRIMARY KEY(vertex_id, inhabitant_id)
+);
+
+DELETE FROM src_dst;
+DELETE FROM loc_time;
+DELETE FROM witness_count;
@@ -0,0 +1,84 @@
+"""
+Inhabitant random path generation, vectorized over all the legs of the day.
+
+Given the time that the inhabitant MAY leave the source vertex (e.g. get up at home)
+and the time that the inhabitant MUST arrive at the destination vertex (e.g. class begins at school),
+find a random path that satisfies this time constraint and stops for random durations
+in the vertices in between (including the source and the destination).
+
+All legs are advanced in lockstep: in each step, every leg that has not reached its destination
+traverses one randomly chosen edge, such that the time to traverse the edge plus the shortest time
+from the neighboring vertex to the destination does not exceed the constraint.
+"""
+
+import numpy as np
+from typing import List, Sequence, Tuple
+from dsimulator.pathfinding import Adjacency
+
+LocTime = Tuple[int, int, int, int, int, int]
+
+
+def neighbor_table(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the CSR adjacency as `(neighbor, cost)` tables padded to the maximum degree, where padding is -1."""
+    degree = np.diff(indptr)
+    start = np.repeat(np.arange(len(degree)), degree)
+    column = np.arange(len(indices)) - indptr[start]
+
+    neighbor = np.full((len(degree), max(degree.max(initial=0), 1)), -1, dtype=np.int64)
+    cost = np.zeros(neighbor.shape, dtype=np.int64)
+    neighbor[start, column] = indices
+    cost[start, column] = weights
+    return neighbor, cost
+
+
+def generate(legs: Sequence[Tuple[int, int, int, int, int]], graph: Adjacency, d: np.ndarray, rng: np.random.Generator) -> List[LocTime]:
+    """
+    Return the `loc_time` tuples for the legs `(inhabitant_id, src, dst, t_src, t_dst)`.
+
+    `graph` is the road graph to walk on and `d` the shortest distances between its vertices.
+    If the destination cannot be reached in time, the inhabitant stays at the source with an unknown leaving time.
+    """
+    vertex_ids, indptr, indices, weights = graph
+    neighbor, cost = neighbor_table(indptr, indices, weights)
+    legs = np.array(legs, dtype=np.int64).reshape(-1, 5)
+    inhabitant = legs[:, 0]
+    cur = np.searchsorted(vertex_ids, legs[:, 1])
+    dst = np.searchsorted(vertex_ids, legs[:, 2])
+    t_src = legs[:, 3]
+    t_dst = legs[:, 4]
+
+    # Wait randomly at the source vertices.
+    slack = t_dst - t_src - d[cur, dst]
+    feasible = slack >= 0
+    slack = np.where(feasible, slack, 0).astype(np.int64)
+    leave = t_src + rng.integers(0, slack + 1)
+
+    rows = list(zip(inhabitant.tolist(), vertex_ids[cur].tolist(), t_src.tolist(),
+                    [t if f else None for t, f in zip(leave.tolist(), feasible.tolist())],
+                    vertex_ids[dst].tolist(), t_dst.tolist()))
+
+    active = np.flatnonzero(feasible & (cur != dst))
+    while len(active) > 0:
+        # Find the edges that still allow reaching the destination in time, and choose one of them randomly.
+        candidate = neighbor[cur[active]]
+        arrive = leave[active, None] + cost[cur[active]]
+        remaining = np.where(candidate >= 0, d[candidate, dst[active, None]], np.inf)
+        plausible = arrive + remaining <= t_dst[active, None]
+
+        moving = plausible.any(axis=1)
+        choice = np.where(plausible, rng.random(plausible.shape), -1).argmax(axis=1)[moving]
+        active = active[moving]
+        arrive = arrive[moving, choice]
+        cur[active] = candidate[moving, choice]
+
+        # Wait at the neighboring vertex for a random amount of time.
+        slack = (t_dst[active] - arrive - d[cur[active], dst[active]]).astype(np.int64)
+        leave[active] = arrive + rng.integers(0, slack + 1)
+
+        rows.extend(zip(inhabitant[active].tolist(), vertex_ids[cur[active]].tolist(), arrive.tolist(),
+                        leave[active].tolist(), vertex_ids[dst[active]].tolist(), t_dst[active].tolist()))
+
+        # Stop when the destination is reached.
+        active = active[cur[active] != dst[active]]
+
+    return rows
@@ -0,0 +1,316 @@
+"""
+All-pairs shortest path engine for the road graph.
+
+The graph is loaded from the database into a CSR (compressed sparse row) adjacency,
+Dijkstra is run once per source vertex, and the resulting distance matrix is bulk-loaded into `dist`.
+Unreachable pairs are represented by `numpy.inf` in the matrix and by NULL in `dist`.
+
+Vertices under lockdown are given as a boolean mask `blocked`, which removes every edge touching them
+(the same as `modified_edge`). When a single vertex is locked or unlocked, the matrix can be repaired
+in place by lock_vertex() and unlock_vertex() instead of being recomputed.
+"""
+
+import heapq
+import sqlite3
+import numpy as np
+from typing import Dict, List, Tuple
+
+Adjacency = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def load_adjacency(con: sqlite3.Connection, edge_table: str = 'edge') -> Adjacency:
+    """
+    Return `(vertex_ids, indptr, indices, weights)` describing the graph in CSR form.
+
+    `vertex_ids` is sorted; the edges leaving vertex `vertex_ids[i]` are
+    `indices[indptr[i]:indptr[i + 1]]` (positions into `vertex_ids`) with costs `weights[indptr[i]:indptr[i + 1]]`.
+    """
+    vertex_ids = np.array([r[0] for r in con.execute('SELECT vertex_id FROM vertex ORDER BY vertex_id')], dtype=np.int64)
+    edges = np.array(con.execute('SELECT start, end, cost_min FROM {0}'.format(edge_table)).fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    start = np.searchsorted(vertex_ids, edges[:, 0])
+    end = np.searchsorted(vertex_ids, edges[:, 1])
+    order = np.argsort(start, kind='stable')
+
+    indptr = np.zeros(len(vertex_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(start, minlength=len(vertex_ids)), out=indptr[1:])
+    return vertex_ids, indptr, end[order], edges[order, 2]
+
+
+def load_blocked(con: sqlite3.Connection, vertex_ids: np.ndarray) -> np.ndarray:
+    """Return the mask of the vertices under lockdown, aligned with `vertex_ids`."""
+    locked = [r[0] for r in con.execute('SELECT building_id FROM lockdown_building')]
+    return np.isin(vertex_ids, locked)
+
+
+def dijkstra(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, source: int, blocked: np.ndarray = None) -> np.ndarray:
+    """Return the shortest distances from the vertex at position `source` to every vertex, avoiding `blocked` vertices."""
+    d = np.full(len(indptr) - 1, np.inf)
+    d[source] = 0
+    if blocked is not None and blocked[source]:
+        return d
+
+    # Plain lists are much faster than numpy arrays for the scalar accesses below.
+    ptr = indptr.tolist()
+    nbr = indices.tolist()
+    cost = weights.tolist()
+    best = d.tolist()
+    if blocked is not None:
+        # A blocked vertex can never be improved, so it is never reached.
+        for v in np.flatnonzero(blocked).tolist():
+            best[v] = -1
+
+    heap = [(0, source)]
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > best[u]:
+            continue
+        for i in range(ptr[u], ptr[u + 1]):
+            v = nbr[i]
+            dv = du + cost[i]
+            if dv < best[v]:
+                best[v] = dv
+                heapq.heappush(heap, (dv, v))
+
+    d[:] = best
+    if blocked is not None:
+        d[blocked] = np.inf
+    return d
+
+
+def all_pairs(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, blocked: np.ndarray = None) -> np.ndarray:
+    """Return the matrix of shortest distances between all pairs of vertex positions."""
+    return np.stack([dijkstra(indptr, indices, weights, s, blocked) for s in range(len(indptr) - 1)])
+
+
+def reverse_adjacency(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return `(in_indptr, in_indices, in_weights)` describing the in-edges of the graph in CSR form.
+
+    The edges entering vertex `i` come from `in_indices[in_indptr[i]:in_indptr[i + 1]]` with costs `in_weights[...]`.
+    It is built once with the graph, for lock_vertex() and unlock_vertex().
+    """
+    start = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    in_indptr = np.zeros_like(indptr)
+    np.cumsum(np.bincount(indices, minlength=len(indptr) - 1), out=in_indptr[1:])
+    return in_indptr, start[order], weights[order]
+
+
+# The positions `(src, dst)` of some pairs of the distance matrix, as two arrays.
+Pairs = Tuple[np.ndarray, np.ndarray]
+
+
+def through_vertex(row: np.ndarray, ptr: List[int], nbr: List[int], cost: List[int], v: int) -> List[int]:
+    """
+    Return the vertices, other than `v`, that some shortest path from the source of `row` reaches through `v`.
+
+    They are the vertices reached from `v` by the edges lying on a shortest path from the source,
+    as every edge of a shortest path does, so only them and their out-edges are visited.
+    """
+    seen = {v}
+    stack = [v]
+    through = []
+    while stack:
+        u = stack.pop()
+        du = row.item(u)
+        for i in range(ptr[u], ptr[u + 1]):
+            w = nbr[i]
+            if w not in seen and du + cost[i] == row.item(w):
+                seen.add(w)
+                through.append(w)
+                stack.append(w)
+    return through
+
+
+def repair_source(row: np.ndarray, graph: Tuple[List[int], ...], blocked: List[bool], affected: List[int]) -> List[float]:
+    """
+    Return the new distances from a source to the `affected` vertices, whose shortest paths from it were all cut.
+
+    `row` has the distances from the source, which are still right for the other vertices,
+    and `graph` is `(indptr, indices, weights, in_indptr, in_indices, in_weights)` as lists, with the in-edges too.
+    Each affected vertex starts from its best in-edge from an unaffected vertex, then Dijkstra runs among them only.
+    """
+    ptr, nbr, cost, in_ptr, in_nbr, in_cost = graph
+    best = dict.fromkeys(affected, np.inf)
+    for t in affected:
+        for i in range(in_ptr[t], in_ptr[t + 1]):
+            u = in_nbr[i]
+            if u not in best and not blocked[u] and row.item(u) + in_cost[i] < best[t]:
+                best[t] = row.item(u) + in_cost[i]
+
+    heap = [(du, u) for u, du in best.items() if du < np.inf]
+    heapq.heapify(heap)
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > best[u]:
+            continue
+        for i in range(ptr[u], ptr[u + 1]):
+            v = nbr[i]
+            dv = du + cost[i]
+            if v in best and dv < best[v]:
+                best[v] = dv
+                heapq.heappush(heap, (dv, v))
+    return [best[t] for t in affected]
+
+
+def improve_source(row: np.ndarray, ptr: List[int], nbr: List[int], cost: List[int], blocked: List[bool],
+                   v: int, dv: float) -> Dict[int, float]:
+    """
+    Return the vertices, other than `v`, to which the source of `row` gets closer through `v` at distance `dv`.
+
+    Dijkstra runs from `v` and stops at the vertices that do not get closer,
+    as the vertices beyond them do not get closer through them either.
+    """
+    best = {v: dv}
+    heap = [(dv, v)]
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > best[u]:
+            continue
+        for i in range(ptr[u], ptr[u + 1]):
+            w = nbr[i]
+            dw = du + cost[i]
+            if not blocked[w] and dw < best.get(w, row.item(w)):
+                best[w] = dw
+                heapq.heappush(heap, (dw, w))
+    del best[v]
+    return best
+
+
+# The fraction of the pairs above which lock_vertex() recomputes the whole matrix instead of repairing it.
+FULL_REPAIR_FRACTION = 0.25
+
+
+def lock_vertex(d: np.ndarray, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+                reverse: Tuple[np.ndarray, np.ndarray, np.ndarray], blocked: np.ndarray, v: int) -> Pairs:
+    """
+    Block the vertex at position `v` and repair `d` in place.
+
+    Only the pairs having a shortest path through `v` are searched again, by repair_source(),
+    unless they are so many that recomputing the whole matrix is faster.
+    They are found from the sources whose shortest path to an out-neighbor of `v` goes through `v`,
+    so that the work depends on the number of pairs affected rather than on the size of the matrix.
+    `reverse` is the in-edges of the graph, as returned by reverse_adjacency(). Return the pairs whose distance has changed.
+    """
+    blocked[v] = True
+    ptr, nbr, cost = indptr.tolist(), indices.tolist(), weights.tolist()
+
+    to_v = d[:, v]
+    sources = np.zeros(len(d), dtype=bool)
+    for w, c in zip(indices[indptr[v]:indptr[v + 1]].tolist(), weights[indptr[v]:indptr[v + 1]].tolist()):
+        sources |= np.isfinite(to_v) & (to_v + c == d[:, w])
+    sources[v] = False
+    affected = {s: through_vertex(d[s], ptr, nbr, cost, v) for s in np.flatnonzero(sources).tolist()}
+
+    if sum(map(len, affected.values())) > FULL_REPAIR_FRACTION * d.size:
+        new = all_pairs(indptr, indices, weights, blocked)
+        changed = np.nonzero(new != d)
+        d[:] = new
+        return changed
+
+    # The distances to and from v itself are all cut.
+    into = np.flatnonzero(np.isfinite(d[:, v]))
+    into = into[into != v]
+    out_of = np.flatnonzero(np.isfinite(d[v, :]))
+    out_of = out_of[out_of != v]
+    d[into, v] = np.inf
+    d[v, out_of] = np.inf
+    src = [into, np.full(len(out_of), v)]
+    dst = [np.full(len(into), v), out_of]
+
+    graph = (ptr, nbr, cost) + tuple(a.tolist() for a in reverse)
+    blocked_list = blocked.tolist()
+    for s, targets in affected.items():
+        targets = np.array(targets, dtype=np.int64)
+        new = np.array(repair_source(d[s], graph, blocked_list, targets.tolist()))
+        differ = new != d[s, targets]
+        d[s, targets] = new
+        src.append(np.full(np.count_nonzero(differ), s))
+        dst.append(targets[differ])
+    return np.concatenate(src), np.concatenate(dst)
+
+
+def unlock_vertex(d: np.ndarray, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+                  reverse: Tuple[np.ndarray, np.ndarray, np.ndarray], blocked: np.ndarray, v: int) -> Pairs:
+    """
+    Unblock the vertex at position `v` and repair `d` in place.
+
+    A pair can only become shorter by going through `v`. The distances to and from `v` are built from
+    the distances to its in-neighbors and from its out-neighbors, then the other pairs are only searched
+    from the sources that get closer to an out-neighbor of `v`, by improve_source().
+    `reverse` is the in-edges of the graph, as returned by reverse_adjacency(). Return the pairs whose distance has changed.
+    """
+    blocked[v] = False
+    in_indptr, in_indices, in_weights = reverse
+
+    # Distances from every vertex to v, entering through an unblocked in-neighbor.
+    ins = slice(in_indptr[v], in_indptr[v + 1])
+    enter = ~blocked[in_indices[ins]]
+    to_v = np.min(d[:, in_indices[ins][enter]] + in_weights[ins][enter], axis=1, initial=np.inf)
+    to_v[v] = 0
+
+    # Distances from v to every vertex, leaving through an unblocked out-neighbor.
+    out = slice(indptr[v], indptr[v + 1])
+    leave = ~blocked[indices[out]]
+    from_v = np.min(weights[out][leave, None] + d[indices[out][leave], :], axis=0, initial=np.inf)
+    from_v[v] = 0
+
+    into = np.flatnonzero(to_v < d[:, v])
+    out_of = np.flatnonzero(from_v < d[v, :])
+    d[into, v] = to_v[into]
+    d[v, out_of] = from_v[out_of]
+    src = [into, np.full(len(out_of), v)]
+    dst = [np.full(len(into), v), out_of]
+
+    sources = np.zeros(len(d), dtype=bool)
+    for w, c in zip(indices[out][leave].tolist(), weights[out][leave].tolist()):
+        sources |= to_v + c < d[:, w]
+    sources[v] = False
+    ptr, nbr, cost = indptr.tolist(), indices.tolist(), weights.tolist()
+    blocked_list = blocked.tolist()
+    for s in np.flatnonzero(sources).tolist():
+        closer = improve_source(d[s], ptr, nbr, cost, blocked_list, v, to_v.item(s))
+        targets = np.fromiter(closer.keys(), dtype=np.int64, count=len(closer))
+        d[s, targets] = np.fromiter(closer.values(), dtype=float, count=len(closer))
+        src.append(np.full(len(targets), s))
+        dst.append(targets)
+    return np.concatenate(src), np.concatenate(dst)
+
+
+def update_blocked(d: np.ndarray, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+                   reverse: Tuple[np.ndarray, np.ndarray, np.ndarray], blocked: np.ndarray, new_blocked: np.ndarray) -> Pairs:
+    """
+    Repair `d` in place for every vertex whose status differs between `blocked` and `new_blocked`.
+
+    `blocked` is updated to `new_blocked` in the process. Return the pairs whose distance has changed, each once.
+    """
+    src = [np.zeros(0, dtype=np.int64)]
+    dst = [np.zeros(0, dtype=np.int64)]
+    for v in np.flatnonzero(blocked != new_blocked).tolist():
+        repair = lock_vertex if new_blocked[v] else unlock_vertex
+        s, t = repair(d, indptr, indices, weights, reverse, blocked, v)
+        src.append(s)
+        dst.append(t)
+    return np.divmod(np.unique(np.concatenate(src) * len(d) + np.concatenate(dst)), len(d))
+
+
+def dist_rows(vertex_ids: np.ndarray, d: np.ndarray, pairs: Pairs = None) -> List[Tuple[int, int, int, bool]]:
+    """Return the `(src, dst, d, visited)` tuples of the `pairs`, or of all pairs."""
+    src, dst = np.divmod(np.arange(d.size), len(d)) if pairs is None else pairs
+    lengths = d[src, dst]
+    reachable = np.isfinite(lengths)
+    return list(zip(vertex_ids[src].tolist(), vertex_ids[dst].tolist(),
+                    [int(x) if r else None for x, r in zip(lengths.tolist(), reachable.tolist())],
+                    reachable.tolist()))
+
+
+def write_dist(con: sqlite3.Connection, vertex_ids: np.ndarray, d: np.ndarray) -> None:
+    """Replace the content of `dist` with the distance matrix `d`."""
+    con.execute('DELETE FROM dist')
+    con.executemany('INSERT INTO dist VALUES (?, ?, ?, ?)', dist_rows(vertex_ids, d))
+
+
+def update_dist(con: sqlite3.Connection, vertex_ids: np.ndarray, d: np.ndarray, changed: Pairs) -> None:
+    """Write the `changed` pairs of the distance matrix `d` into `dist`."""
+    con.executemany('UPDATE dist SET d = ?3, visited = ?4 WHERE src = ?1 AND dst = ?2', dist_rows(vertex_ids, d, changed))
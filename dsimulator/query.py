@@ -0,0 +1,70 @@
+"""
+Build the SQL of the inhabitant queries made by the UI, with the values of the filters as bound parameters.
+
+The SQL only depends on which filters are given, called the shape of the filter, and not on their values.
+It is built once per shape, so that a repeated search executes the same SQL text again,
+which SQLite prepares only once thanks to the statement cache of each connection.
+"""
+
+import functools
+from typing import Any, Dict, List, Tuple
+
+# The condition of each filter, with a placeholder for its value if it takes one,
+# and whether it needs the workplace of the inhabitant.
+FILTERS = {
+    'income_lo': ('income >= ?', True),
+    'income_hi': ('income <= ?', True),
+    'occupation': ('occupation_name = ?', True),
+    'gender': ('gender = ?', False),
+    'dead': ('dead = ?', False),
+    'custody': ('custody = ?', False),
+    'home_building_id': ('home_building_id = ?', False),
+    'home_building_name': ('h.building_name = ?', False),
+    'workplace_building_id': ('workplace_building_id = ?', True),
+    'workplace_building_name': ('w.building_name = ?', True),
+    'suspect': ('inhabitant.inhabitant_id IN (SELECT inhabitant_id FROM suspect)', False),
+    'not_suspect': ('NOT EXISTS(SELECT * FROM suspect WHERE suspect.inhabitant_id = inhabitant.inhabitant_id)', False),
+}
+
+# The columns of the rows of the inhabitant queries, by which they can be sorted.
+COLUMNS = ('inhabitant_id', 'first_name', 'last_name', 'home_building_name', 'workplace_id', 'custody', 'dead', 'gender')
+
+Shape = Tuple[str, ...]
+
+
+def bind(filters: Dict[str, Any]) -> Tuple[Shape, List[Any]]:
+    """Return the shape of the filters given as `{name: value}`, and the values of its parameters in order."""
+    shape = tuple(name for name in FILTERS if name in filters)
+    return shape, [filters[name] for name in shape if '?' in FILTERS[name][0]]
+
+
+@functools.lru_cache(maxsize=None)
+def from_where(shape: Shape) -> str:
+    """Return the FROM and WHERE clauses selecting the inhabitants for the filters of the shape."""
+    tables = '''  FROM inhabitant
+                   JOIN building AS h
+                   ON home_building_id = h.building_id'''
+    if any(FILTERS[name][1] for name in shape):
+        tables += '''
+                   NATURAL JOIN workplace
+                   NATURAL JOIN occupation
+                   JOIN building AS w
+                   ON workplace_building_id = w.building_id'''
+    return tables + '\n WHERE ' + ('\n   AND '.join(FILTERS[name][0] for name in shape) or 'TRUE')
+
+
+@functools.lru_cache(maxsize=None)
+def select_inhabitant(shape: Shape, order_by: str, descending: bool) -> str:
+    """Return the query of a page of the inhabitants for the filters of the shape, taking the limit and the offset last."""
+    if order_by not in COLUMNS:
+        raise ValueError('Cannot sort the inhabitants by {0}'.format(order_by))
+    return '''SELECT inhabitant_id, first_name, last_name, h.building_name AS home_building_name, workplace_id, custody, dead, gender
+''' + from_where(shape) + '''
+ ORDER BY {0} {1}, inhabitant_id
+ LIMIT ? OFFSET ?'''.format(order_by, 'DESC' if descending else 'ASC')
+
+
+@functools.lru_cache(maxsize=None)
+def count_inhabitant(shape: Shape) -> str:
+    """Return the query of the number of inhabitants for the filters of the shape."""
+    return 'SELECT COUNT(*)\n' + from_where(shape)
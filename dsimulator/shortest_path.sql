@@ -1,27 +1,16 @@
 /*
-Multi-source shortest path using Dijkstra implemented as recursive trigger.
-This is not implemented with a recursive CTE, which does not modification of the data.
-However, is it necessary for the Dijkstra algorithm to update the label indicating
-where a vertex is in the "visited" set.
+The table of the shortest path between all vertex pairs.
 
-Although Dijkstra is not invented by him, this code is completely written by Yuxiang Lin.
-The idea of using recursive trigger for this purpose comes from this forum post:
-https://sqlite.org/forum/info/7c89903050369164
-However, that post did not provide any implementations.
-While there were implementations of Dijkstra in SQL online,
-I did not base my code off them anyways as SQLite doesn't have loops
-which were used in all these implementations.
+The distances themselves are computed by the engine in pathfinding.py, which runs Dijkstra
+per source over `modified_edge` and bulk-loads the result here.
+It replaces the earlier recursive trigger implementation (see docs/complex_queries),
+which was too slow and ran into SQLITE_MAX_TRIGGER_DEPTH on larger maps.
 
+`d` is NULL and `visited` is FALSE when `dst` is not reachable from `src`.
+The table is kept between turns and only emptied when the distances are recomputed from scratch.
 */
 
-PRAGMA recursive_triggers = ON; -- Need to turn this on manually.
-
--- Note: The default SQLITE_MAX_TRIGGER_DEPTH is just 1000,
--- so it might be necessary to increase this from the Python API.
-
-DROP TABLE IF EXISTS dist;
-
-CREATE TABLE dist(
+CREATE TABLE IF NOT EXISTS dist(
 	src     INTEGER NOT NULL,
 	dst     INTEGER NOT NULL,
 	d       INTEGER,
@@ -29,32 +18,4 @@ CREATE TABLE dist(
 	        PRIMARY KEY(src, dst)
 );
 
-CREATE INDEX idx_dist ON dist(src, visited, d);
-
--- Called when a vertex is added to the "visited" set.
-CREATE TRIGGER update_dist AFTER UPDATE OF visited ON dist
-BEGIN
-	-- Update the shortest distance to the neighbor of this vertex.
-	UPDATE dist
-	   SET d = nd
-	  FROM (SELECT end AS nv, (NEW.d + cost_min) AS nd
-	          FROM modified_edge
-	         WHERE start = NEW.dst)
-	 WHERE src = NEW.src AND dst = nv AND visited = FALSE AND (d IS NULL OR d > nd);
-
-	-- Add the closest vertex that has not been visited into the "visited" set.
-	UPDATE dist
-	   SET visited = TRUE
-	 WHERE src = NEW.src AND visited = FALSE
-	       AND d = (SELECT MIN(d) FROM dist WHERE visited = FALSE);
-END;
-
--- Initialize the table with NULL distances.
-INSERT INTO dist
-	SELECT a.vertex_id, b.vertex_id, NULL, FALSE
-	  FROM vertex AS a, vertex AS b;
-
--- Set the distance from each vertex to itself to be 0 and initiate the recursive trigger.
-UPDATE dist
-   SET d = 0, visited = TRUE
- WHERE src = dst;
+CREATE INDEX IF NOT EXISTS idx_dist ON dist(src, visited, d);
@@ -1,12 +1,14 @@
 """The user interface for the game window where the game is running in."""
 
-from typing import List, Tuple, Callable
+from typing import Any, Tuple, Callable
 import sqlite3
 import math
 from dsimulator.defs import MAIN_WIDTH, MAIN_HEIGHT
 import dearpygui.dearpygui as dpg
 import dsimulator.ui.main as main
 import dsimulator.ui.save as save
+import dsimulator.ui.spatial as spatial
+from dsimulator.ui.table import InhabitantTable, WitnessTable
 import dsimulator.game as game
 
 
@@ -24,6 +26,7 @@ def hide_windows() -> None:
     dpg.hide_item(lose_window)
     dpg.hide_item(win_window)
     dpg.hide_item(wrong_window)
+    dpg.hide_item(perf_window)
 
 
 def to_save() -> None:
@@ -37,6 +40,7 @@ def to_save() -> None:
 
 def to_main() -> None:
     """Hide the game window and go back to main window."""
+    game.set_speculation(False)
     game.close_game()
     close_details()
     hide_windows()
@@ -45,30 +49,36 @@ def to_main() -> None:
     dpg.set_primary_window(main.main_window, True)
 
 
-def draw_inhabitants_table(data: Tuple[Tuple[str, ...], List[Tuple]]) -> None:
-    """Draw a table about inhabitants given the name of the attributes and the tuples of inhabitants."""
-    inhabitant_columns, inhabitant_rows = data
+def draw_inhabitants_table(**predicate: Any) -> None:
+    """Draw a table of the inhabitants selected by the predicate of game.query_inhabitant(), a page at a time."""
+    InhabitantTable(show_inhabitant_detail).show(**predicate)
 
-    with dpg.table(policy=dpg.mvTable_SizingStretchProp):
-        for c in inhabitant_columns:
-            dpg.add_table_column(label=c)
-        dpg.add_table_column()
 
-        for r in inhabitant_rows:
-            with dpg.table_row():
-                for c in r:
-                    dpg.add_text(c)
-                dpg.add_button(label='Details', callback=make_inhabitant_clicked(r[0]))
+def building_clicked() -> None:
+    """Show the detail of the building under the mouse when the map is clicked."""
+    for building_id in building_index.query(*dpg.get_drawing_mouse_pos()):
+        show_building_detail(building_id)
+
+
+def map_hovered() -> None:
+    """Describe the building, vertex or edge under the mouse on the map, in this order of precedence."""
+    x, y = dpg.get_drawing_mouse_pos()
+    hovered = building_index.query(x, y)
+    if hovered:
+        dpg.set_value(map_text, 'Building {0}: {1}'.format(hovered[0], building_names[hovered[0]]))
+        return
 
+    hovered = vertex_index.query(x, y)
+    if hovered:
+        dpg.set_value(map_text, 'Vertex {0}'.format(hovered[0]))
+        return
 
-def make_building_clicked(buildings: List[Tuple[int, int, int]], b_size: int) -> Callable[[], None]:
-    """Create a callback function that is called when any building is clicked."""
-    def building_clicked() -> None:
-        pos = dpg.get_drawing_mouse_pos()
-        for b in buildings:
-            if b[0] - b_size <= pos[0] <= b[0] + b_size and b[1] - b_size <= pos[1] <= b[1] + b_size:
-                show_building_detail(b[2])
-    return building_clicked
+    for start, end in edge_index.query(x, y):
+        s, e, c = edge_lines[start, end]
+        if spatial.segment_distance(x, y, s, e) <= EDGE_MARGIN:
+            dpg.set_value(map_text, 'Edge {0} - {1}: {2} min'.format(start, end, c))
+            return
+    dpg.set_value(map_text, '')
 
 
 def show_building_detail(building_id: int) -> None:
@@ -92,7 +102,7 @@ def show_building_detail(building_id: int) -> None:
             else:
                 dpg.add_text('Income between {} and {}'.format(low, high))
 
-            inhabitant_data = game.query_inhabitant(home_building_id=building_id)
+            predicate = dict(home_building_id=building_id)
         else:
             dpg.add_separator()
             dpg.add_text('Occupations')
@@ -105,27 +115,15 @@ def show_building_detail(building_id: int) -> None:
                         for c in r:
                             dpg.add_text(c)
 
-            inhabitant_data = game.query_inhabitant(workplace_building_id=building_id)
+            predicate = dict(workplace_building_id=building_id)
 
         dpg.add_separator()
         dpg.add_text('Inhabitants')
-        draw_inhabitants_table(inhabitant_data)
+        draw_inhabitants_table(**predicate)
 
         dpg.add_separator()
         dpg.add_text('Witness Counts')
-        result = game.query_witness_count(building_id)
-        with dpg.table(policy=dpg.mvTable_SizingStretchProp):
-            dpg.add_table_column(label='inhabitant_id')
-            dpg.add_table_column(label='first_name')
-            dpg.add_table_column(label='last_name')
-            dpg.add_table_column(label='count')
-            dpg.add_table_column()
-
-            for r in result:
-                with dpg.table_row():
-                    for c in r:
-                        dpg.add_text(c)
-                    dpg.add_button(label='Details', callback=make_inhabitant_clicked(r[0]))
+        WitnessTable(show_inhabitant_detail).show(vertex_id=building_id)
 
 
 def close_building_detail() -> None:
@@ -166,43 +164,47 @@ def make_modify_suspect(inhabitant_id: int) -> Callable[[], None]:
 def make_inhabitant_clicked(inhabitant_id: int) -> Callable[[], None]:
     """Create a callback function that is called when a inhabitant row is clicked."""
     def inhabitant_clicked() -> None:
-        close_inhabitant_detail()
-        dpg.hide_item(query_view)
-        with dpg.group(tag='inhabitant_detail', parent=right_view):
-            with dpg.group(horizontal=True):
-                dpg.add_text('Inhabitant Detail')
-                dpg.add_button(label='Close', callback=close_inhabitant_detail)
-                dpg.add_button(label='Accuse', callback=make_accuse(inhabitant_id))
-                dpg.add_button(label='Toggle Suspect', callback=make_modify_suspect(inhabitant_id))
-
-            keys, values = game.query_inhabitant_detail(inhabitant_id)
-            with dpg.table(header_row=False, policy=dpg.mvTable_SizingStretchProp):
-                dpg.add_table_column()
-                dpg.add_table_column()
-
-                for k, v in zip(keys, values):
-                    with dpg.table_row():
-                        dpg.add_text(k)
-                        dpg.add_text(v)
+        show_inhabitant_detail(inhabitant_id)
+    return inhabitant_clicked
 
-            dpg.add_separator()
-            dpg.add_text('Relationships')
 
-            relationship_rows = game.query_inhabitant_relationship(inhabitant_id)
-            with dpg.table(policy=dpg.mvTable_SizingStretchProp):
-                dpg.add_table_column(label='inhabitant_id')
-                dpg.add_table_column(label='object_first_name')
-                dpg.add_table_column(label='object_last_name')
-                dpg.add_table_column(label='description')
-                dpg.add_table_column()
+def show_inhabitant_detail(inhabitant_id: int) -> None:
+    """Replace the query view with a view of inhabitant detail."""
+    close_inhabitant_detail()
+    dpg.hide_item(query_view)
+    with dpg.group(tag='inhabitant_detail', parent=right_view):
+        with dpg.group(horizontal=True):
+            dpg.add_text('Inhabitant Detail')
+            dpg.add_button(label='Close', callback=close_inhabitant_detail)
+            dpg.add_button(label='Accuse', callback=make_accuse(inhabitant_id))
+            dpg.add_button(label='Toggle Suspect', callback=make_modify_suspect(inhabitant_id))
 
-                for r in relationship_rows:
-                    with dpg.table_row():
-                        for c in r:
-                            dpg.add_text(c)
-                        dpg.add_button(label='Details', callback=make_inhabitant_clicked(r[0]))
+        keys, values = game.query_inhabitant_detail(inhabitant_id)
+        with dpg.table(header_row=False, policy=dpg.mvTable_SizingStretchProp):
+            dpg.add_table_column()
+            dpg.add_table_column()
 
-    return inhabitant_clicked
+            for k, v in zip(keys, values):
+                with dpg.table_row():
+                    dpg.add_text(k)
+                    dpg.add_text(v)
+
+        dpg.add_separator()
+        dpg.add_text('Relationships')
+
+        relationship_rows = game.query_inhabitant_relationship(inhabitant_id)
+        with dpg.table(policy=dpg.mvTable_SizingStretchProp):
+            dpg.add_table_column(label='inhabitant_id')
+            dpg.add_table_column(label='object_first_name')
+            dpg.add_table_column(label='object_last_name')
+            dpg.add_table_column(label='description')
+            dpg.add_table_column()
+
+            for r in relationship_rows:
+                with dpg.table_row():
+                    for c in r:
+                        dpg.add_text(c)
+                    dpg.add_button(label='Details', callback=make_inhabitant_clicked(r[0]))
 
 
 def close_inhabitant_detail() -> None:
@@ -222,7 +224,7 @@ def update_victim() -> None:
     """Update the victim window."""
     dpg.delete_item(victim_window, children_only=True)
     with dpg.group(parent=victim_window):
-        draw_inhabitants_table(game.query_inhabitant(dead=True))
+        draw_inhabitants_table(dead=True)
 
         dpg.add_separator()
 
@@ -249,7 +251,7 @@ def update_suspect() -> None:
     """Update the suspect window."""
     dpg.delete_item(suspect_window, children_only=True)
     with dpg.group(parent=suspect_window):
-        draw_inhabitants_table(game.query_inhabitant(suspect=True))
+        draw_inhabitants_table(suspect=True)
 
 
 def show_via_point() -> None:
@@ -286,32 +288,108 @@ def update_via_point() -> None:
                     dpg.add_text(c)
 
 
+def show_perf() -> None:
+    """Show the performance window."""
+    update_perf()
+    dpg.show_item(perf_window)
+
+
+def toggle_profiling(sender: int, enabled: bool) -> None:
+    """Turn profiling of the game functions on or off according to the checkbox."""
+    game.set_profiling(enabled)
+
+
+def clear_perf() -> None:
+    """Clear the recorded measurements."""
+    game.perf_log.clear()
+    update_perf()
+
+
+def update_perf() -> None:
+    """Update the performance window with the recorded measurements, most recent first."""
+    dpg.delete_item(perf_table, children_only=True)
+
+    for c in game.PerfRecord._fields:
+        dpg.add_table_column(label=c, parent=perf_table)
+
+    for r in reversed(game.perf_log):
+        with dpg.table_row(parent=perf_table):
+            dpg.add_text(r.name)
+            dpg.add_text(r.args)
+            dpg.add_text(r.day)
+            dpg.add_text('{:.3f} ms'.format(r.seconds * 1000))
+            dpg.add_text(r.rows)
+            dpg.add_text(r.changes)
+
+
 def next_turn() -> None:
-    """Execute one turn of the game."""
-    game.next_day()
+    """Start computing one turn of the game in the background, and show its progress until it is done."""
+    global turn
+    if turn is not None:
+        return
     close_details()
     hide_windows()
+    turn = game.start_next_day()
+    dpg.set_value(turn_text, '')
+    dpg.set_value(turn_bar, 0.0)
+    dpg.show_item(turn_window)
+    poll_turn()
+
+
+def poll_turn() -> None:
+    """Update the progress of the turn every frame, and update the game window once the turn is done."""
+    global turn
+    dpg.set_value(turn_text, turn.phase or 'Starting')
+    dpg.set_value(turn_bar, turn.fraction)
+    if not turn.done():
+        dpg.set_frame_callback(dpg.get_frame_count() + 1, poll_turn)
+        return
+
+    finished = turn
+    turn = None
+    dpg.hide_item(turn_window)
+    if isinstance(finished.future.exception(), game.TurnCancelled):
+        return
+    # Raise the error of a failed turn here, as the executor would keep it to itself.
+    finished.future.result()
     update_game_window()
 
 
-def update_game_window() -> None:
-    """Update the status, game map, and query result in the game window."""
-    dpg.set_value(day_text, 'Current Day {}'.format(game.day))
-    dpg.set_value(resig_text, 'Resignation Day {}'.format(game.resig_day))
-    if game.end_game_condition()[0]:
-        dpg.show_item(lose_window)
+def cancel_turn() -> None:
+    """Cancel the turn being computed, which stops at the beginning of its next phase."""
+    if turn is not None:
+        turn.cancel()
+        dpg.set_value(turn_text, 'Cancelling')
+
+
+def to_map(x: float, y: float) -> Tuple[float, float]:
+    """Convert the coordinates of a vertex to the position on the map."""
+    return (x + MAP_OFFSET) * MAP_SCALE, (y + MAP_OFFSET) * MAP_SCALE
 
+
+def draw_map() -> None:
+    """Draw the map of a new game, which is then kept and only updated where the lockdown status changes."""
+    global map_lockdown
     dpg.delete_item(game_map, children_only=True)
-    scale = 180
-    offset = 1
-    for i, x, y in game.list_vertex():
-        dpg.draw_circle(((x + offset) * scale, (y + offset) * scale), 15, color=(255, 255, 255, 255), fill=(255, 255, 255, 255), parent=game_map)
+    building_items.clear()
+    edge_items.clear()
+    building_edges.clear()
+    building_names.clear()
+    edge_lines.clear()
+    building_index.clear()
+    vertex_index.clear()
+    edge_index.clear()
+
+    vertices = game.list_vertex()
+    for i, x, y in vertices:
+        xd, yd = to_map(x, y)
+        dpg.draw_circle((xd, yd), VERTEX_RADIUS, color=(255, 255, 255, 255), fill=(255, 255, 255, 255), parent=game_map)
+        vertex_index.insert((xd - VERTEX_RADIUS, yd - VERTEX_RADIUS, xd + VERTEX_RADIUS, yd + VERTEX_RADIUS), i)
 
-    font_size = 20
     shift = 12
-    for sx, sy, ex, ey, c in game.list_edge():
-        s = ((sx + offset) * scale, (sy + offset) * scale)
-        e = ((ex + offset) * scale, (ey + offset) * scale)
+    for start, end, sx, sy, ex, ey, c in game.list_edge():
+        s = to_map(sx, sy)
+        e = to_map(ex, ey)
 
         dx = e[0] - s[0]
         dy = e[1] - s[1]
@@ -319,27 +397,70 @@ def update_game_window() -> None:
         shift_x = -shift * dy / length
         shift_y = shift * dx / length
 
-        dpg.draw_line(s, e, thickness=4, color=(255, 255, 255, 255), parent=game_map)
-        dpg.draw_text(((s[0] / 3 + 2 * e[0] / 3) - font_size / 2 + shift_x, (s[1] / 3 + 2 * e[1] / 3) - font_size / 2 + shift_y),
-                      str(c), size=font_size, parent=game_map)
-
-    buildings = []
-    b_size = 20
-    for x, y, building_id, building_name in game.list_building():
-        xd = (x + offset) * scale
-        yd = (y + offset) * scale
-        dpg.draw_rectangle((xd - b_size, yd - b_size), (xd + b_size, yd + b_size), color=(255, 0, 0, 255), fill=(255, 0, 0, 255), parent=game_map)
-        dpg.draw_text((xd - b_size, yd + b_size), building_name, size=font_size, color=(255, 0, 0, 255), parent=game_map)
-        buildings.append((xd, yd, building_id))
+        edge_items[start, end] = dpg.draw_line(s, e, thickness=4, color=EDGE_COLOR, parent=game_map)
+        building_edges.setdefault(start, []).append((start, end))
+        building_edges.setdefault(end, []).append((start, end))
+        edge_lines[start, end] = s, e, c
+        edge_index.insert(spatial.segment_box(s, e, EDGE_MARGIN), (start, end))
+        dpg.draw_text(((s[0] / 3 + 2 * e[0] / 3) - FONT_SIZE / 2 + shift_x, (s[1] / 3 + 2 * e[1] / 3) - FONT_SIZE / 2 + shift_y),
+                      str(c), size=FONT_SIZE, parent=game_map)
+
+    map_lockdown = {}
+    for x, y, building_id, building_name, _ in game.list_building():
+        xd, yd = to_map(x, y)
+        rectangle = dpg.draw_rectangle((xd - BUILDING_SIZE, yd - BUILDING_SIZE), (xd + BUILDING_SIZE, yd + BUILDING_SIZE),
+                                       color=BUILDING_COLOR, fill=BUILDING_COLOR, parent=game_map)
+        text = dpg.draw_text((xd - BUILDING_SIZE, yd + BUILDING_SIZE), building_name, size=FONT_SIZE, color=BUILDING_COLOR,
+                             parent=game_map)
+        building_items[building_id] = rectangle, text
+        building_index.insert((xd - BUILDING_SIZE, yd - BUILDING_SIZE, xd + BUILDING_SIZE, yd + BUILDING_SIZE), building_id)
+        building_names[building_id] = building_name
+        map_lockdown[building_id] = 0
+
+    for i, x, y in vertices:
+        xd, yd = to_map(x, y)
+        dpg.draw_text((xd - FONT_SIZE / 2, yd - FONT_SIZE / 2), str(i), size=FONT_SIZE, color=(0, 0, 0, 255), parent=game_map)
+
+
+def update_map() -> None:
+    """Recolor the buildings whose lockdown status has changed since the map was last updated, and their edges."""
+    changed = []
+    for _, _, building_id, _, lockdown in game.list_building():
+        if map_lockdown[building_id] != lockdown:
+            map_lockdown[building_id] = lockdown
+            changed.append(building_id)
+
+    for building_id in changed:
+        color = LOCKDOWN_COLOR if map_lockdown[building_id] else BUILDING_COLOR
+        rectangle, text = building_items[building_id]
+        dpg.configure_item(rectangle, color=color, fill=color)
+        dpg.configure_item(text, color=color)
+
+    for start, end in {e for building_id in changed for e in building_edges[building_id]}:
+        closed = map_lockdown.get(start, 0) or map_lockdown.get(end, 0)
+        dpg.configure_item(edge_items[start, end], color=LOCKDOWN_EDGE_COLOR if closed else EDGE_COLOR)
+
+
+def new_game_window() -> None:
+    """
+    Draw the map of the game just started or loaded, then update the game window.
+
+    The next day is computed in advance while the player examines the current one, as long as the game window is open.
+    """
+    game.set_speculation(True)
+    game.speculate()
+    draw_map()
+    update_game_window()
 
-    for i, x, y in game.list_vertex():
-        dpg.draw_text(((x + offset) * scale - font_size / 2, (y + offset) * scale - font_size / 2), str(i), size=font_size, color=(0, 0, 0, 255), parent=game_map)
 
-    with dpg.item_handler_registry() as map_handler:
-        dpg.add_item_clicked_handler(callback=make_building_clicked(buildings, b_size))
-    dpg.bind_item_handler_registry(game_map, map_handler)
+def update_game_window() -> None:
+    """Update the status, game map, and query result in the game window."""
+    dpg.set_value(day_text, 'Current Day {}'.format(game.day))
+    dpg.set_value(resig_text, 'Resignation Day {}'.format(game.resig_day))
+    if game.end_game_condition()[0]:
+        dpg.show_item(lose_window)
 
-    dpg.delete_item(query_table, children_only=True)
+    update_map()
 
     try:
         income_lo = dpg.get_value(income_lo_input)
@@ -361,36 +482,60 @@ def update_game_window() -> None:
         suspect = dpg.get_value(suspect_input)
         suspect = (int(suspect) == 1) if len(suspect) > 0 else None
 
-        inhabitant_columns, inhabitant_rows = game.query_inhabitant(
+        query_table.show(
             income_lo=income_lo, income_hi=income_hi, occupation=occupation,
             gender=gender, dead=dead,
             home_building_name=home_building_name, workplace_building_name=workplace_building_name,
             custody=custody, suspect=suspect)
 
     except ValueError:
-        dpg.add_table_column(label='Input Error', parent=query_table)
+        query_table.show_error('Input Error')
 
     except sqlite3.OperationalError:
-        dpg.add_table_column(label='Query Error', parent=query_table)
-
-    else:
-        for c in inhabitant_columns:
-            dpg.add_table_column(label=c, parent=query_table)
-        dpg.add_table_column(parent=query_table)
-
-        for r in inhabitant_rows:
-            with dpg.table_row(parent=query_table):
-                for c in r:
-                    dpg.add_text(c)
-                dpg.add_button(label='Details', callback=make_inhabitant_clicked(r[0]))
-
+        query_table.show_error('Query Error')
+
+
+# The turn being computed in the background, if any.
+turn = None
+
+# The layout of the map.
+MAP_SCALE = 180
+MAP_OFFSET = 1
+BUILDING_SIZE = 20
+VERTEX_RADIUS = 15
+EDGE_MARGIN = 4
+FONT_SIZE = 20
+EDGE_COLOR = (255, 255, 255, 255)
+BUILDING_COLOR = (255, 0, 0, 255)
+LOCKDOWN_EDGE_COLOR = (80, 80, 80, 255)
+LOCKDOWN_COLOR = (120, 120, 120, 255)
+
+# The items drawn on the map of the current game, keyed by building_id and by the (start, end) vertices of the edges,
+# the edges of each building, and the lockdown status that each building is drawn with.
+building_items = {}
+edge_items = {}
+building_edges = {}
+map_lockdown = {}
+# The names of the buildings, and the ends and cost of the edges, keyed like their items.
+building_names = {}
+edge_lines = {}
+# The items under the mouse are found in grids whose cells are about the size of the map between two vertices.
+building_index = spatial.GridIndex(MAP_SCALE)
+vertex_index = spatial.GridIndex(MAP_SCALE)
+edge_index = spatial.GridIndex(MAP_SCALE)
 
 with dpg.window() as game_window:
     with dpg.group(height=0.93 * MAIN_HEIGHT, horizontal=True):
         with dpg.child_window(width=0.4 * MAIN_WIDTH, horizontal_scrollbar=True) as left_view:
             with dpg.group() as map_view:
-                dpg.add_text('Map')
+                with dpg.group(horizontal=True):
+                    dpg.add_text('Map')
+                    map_text = dpg.add_text()
                 game_map = dpg.add_drawlist(width=3000, height=3000)
+                with dpg.item_handler_registry() as map_handler:
+                    dpg.add_item_clicked_handler(callback=building_clicked)
+                    dpg.add_item_hover_handler(callback=map_hovered)
+                dpg.bind_item_handler_registry(game_map, map_handler)
 
         with dpg.child_window() as right_view:
             with dpg.group() as query_view:
@@ -425,7 +570,7 @@ with dpg.window() as game_window:
                     suspect_input = dpg.add_input_text()
 
                 dpg.add_button(label='Search', callback=update_game_window)
-                query_table = dpg.add_table(policy=dpg.mvTable_SizingStretchProp)
+                query_table = InhabitantTable(show_inhabitant_detail)
 
     with dpg.group(horizontal=True):
         dpg.add_button(label='Save Game', callback=to_save)
@@ -436,6 +581,7 @@ with dpg.window() as game_window:
         dpg.add_button(label='Victim', callback=show_victim)
         dpg.add_button(label='Suspect', callback=show_suspect)
         dpg.add_button(label='Via Point', callback=show_via_point)
+        dpg.add_button(label='Performance', callback=show_perf)
 
         dpg.add_spacer()
 
@@ -464,6 +610,21 @@ with dpg.window(label='Via Point', width=MAIN_WIDTH / 2, height=MAIN_HEIGHT / 2)
 
 dpg.hide_item(via_point_window)
 
+with dpg.window(label='Performance', width=MAIN_WIDTH / 2, height=MAIN_HEIGHT / 2) as perf_window:
+    with dpg.group(horizontal=True):
+        dpg.add_checkbox(label='Profiling', callback=toggle_profiling)
+        dpg.add_button(label='Refresh', callback=update_perf)
+        dpg.add_button(label='Clear', callback=clear_perf)
+    perf_table = dpg.add_table(policy=dpg.mvTable_SizingStretchProp)
+
+dpg.hide_item(perf_window)
+
+with dpg.window(label='Next Turn', modal=True, no_close=True, width=MAIN_WIDTH / 3, height=MAIN_HEIGHT / 6) as turn_window:
+    turn_text = dpg.add_text()
+    turn_bar = dpg.add_progress_bar(width=-1)
+    dpg.add_button(label='Cancel', callback=cancel_turn)
+dpg.hide_item(turn_window)
+
 with dpg.window(label='You Lose', width=MAIN_WIDTH / 2, height=MAIN_HEIGHT / 2) as lose_window:
     dpg.add_text('You have resigned after failing to catch the killer on time.')
 dpg.hide_item(lose_window)
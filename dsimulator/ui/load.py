@@ -3,7 +3,7 @@
 import dearpygui.dearpygui as dpg
 import dsimulator.ui.main as main
 import dsimulator.ui.game as ui_game
-from dsimulator.game import list_save, read_save, delete_save
+from dsimulator.game import list_save, read_save, delete_save, SaveError
 from typing import Callable
 
 
@@ -17,15 +17,20 @@ def to_main() -> None:
 with dpg.window() as load_window:
     dpg.add_text('Load Game')
     save_table = dpg.add_table(header_row=False, policy=dpg.mvTable_SizingStretchProp)
+    load_error = dpg.add_text('')
     dpg.add_button(label='Back', callback=to_main)
     dpg.hide_item(load_window)
 
 
 def make_load(save_id: int) -> Callable[[], None]:
-    """Create a callback function that loads the specific save slot."""
+    """Create a callback function that loads the specific save slot, or shows why it cannot be loaded."""
     def load() -> None:
-        read_save(save_id)
-        ui_game.update_game_window()
+        try:
+            read_save(save_id)
+        except SaveError as e:
+            dpg.set_value(load_error, str(e))
+            return
+        ui_game.new_game_window()
         dpg.hide_item(load_window)
         dpg.show_item(ui_game.game_window)
         dpg.set_primary_window(ui_game.game_window, True)
@@ -43,6 +48,7 @@ def make_delete(save_id: int) -> Callable[[], None]:
 def update_load_window() -> None:
     """Update the load window, reconstruct the save table."""
     dpg.delete_item(save_table, children_only=True)
+    dpg.set_value(load_error, '')
 
     for _ in range(3):
         dpg.add_table_column(parent=save_table)
@@ -0,0 +1,55 @@
+"""
+Find the items drawn on the map under the mouse without scanning all of them.
+
+The bounding boxes of the items are bucketed into the cells of a uniform grid once per map layout,
+so that a point is only tested against the few items of the cell it falls in.
+"""
+
+import math
+from typing import Dict, Hashable, List, Tuple
+
+Box = Tuple[float, float, float, float]
+
+
+class GridIndex:
+    """A uniform grid of square cells holding the `(x_min, y_min, x_max, y_max)` boxes of the items overlapping them."""
+
+    def __init__(self, cell_size: float) -> None:
+        """Create an empty index with cells of `cell_size`, which is best about the size of the items."""
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Tuple[Box, Hashable]]] = {}
+
+    def cell(self, x: float, y: float) -> Tuple[int, int]:
+        """Return the cell containing the point."""
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, box: Box, key: Hashable) -> None:
+        """Add the item `key` with the bounding box `box`."""
+        x_min, y_min = self.cell(box[0], box[1])
+        x_max, y_max = self.cell(box[2], box[3])
+        for i in range(x_min, x_max + 1):
+            for j in range(y_min, y_max + 1):
+                self.cells.setdefault((i, j), []).append((box, key))
+
+    def query(self, x: float, y: float) -> List[Hashable]:
+        """Return the keys of the items whose bounding box contains the point, in the order they were inserted."""
+        return [key for (x_min, y_min, x_max, y_max), key in self.cells.get(self.cell(x, y), [])
+                if x_min <= x <= x_max and y_min <= y <= y_max]
+
+    def clear(self) -> None:
+        """Remove all the items."""
+        self.cells.clear()
+
+
+def segment_box(s: Tuple[float, float], e: Tuple[float, float], margin: float) -> Box:
+    """Return the bounding box of the segment from `s` to `e` enlarged by `margin`."""
+    return min(s[0], e[0]) - margin, min(s[1], e[1]) - margin, max(s[0], e[0]) + margin, max(s[1], e[1]) + margin
+
+
+def segment_distance(x: float, y: float, s: Tuple[float, float], e: Tuple[float, float]) -> float:
+    """Return the distance from the point to the segment from `s` to `e`."""
+    dx = e[0] - s[0]
+    dy = e[1] - s[1]
+    length = dx**2 + dy**2
+    t = 0.0 if length == 0 else min(max(((x - s[0]) * dx + (y - s[1]) * dy) / length, 0.0), 1.0)
+    return math.hypot(x - (s[0] + t * dx), y - (s[1] + t * dy))
@@ -0,0 +1,142 @@
+"""Tables that show one page of a query at a time, sorted and paginated by the database."""
+
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import dearpygui.dearpygui as dpg
+import dsimulator.game as game
+
+PAGE_SIZE = 50
+
+
+class PagedTable:
+    """
+    Show the rows of a query selected by a predicate, a page at a time.
+
+    Only the rows of the current page are created, and sorting by a column queries the database again.
+    The first column of the rows is the inhabitant_id, which the `Details` button of a row passes to `details`.
+    Subclasses run the queries in fetch() and total().
+    """
+
+    def __init__(self, columns: Sequence[str], details: Callable[[int], None], order_by: str, descending: bool = False,
+                 page_size: int = PAGE_SIZE) -> None:
+        """Create the empty table in the current container, sorted by the column `order_by` until another is clicked."""
+        self.details = details
+        self.page_size = page_size
+        self.predicate: Dict[str, Any] = None
+        self.order_by = order_by
+        self.descending = descending
+        self.offset = 0
+        self.count = 0
+
+        with dpg.group() as self.group:
+            with dpg.group(horizontal=True):
+                dpg.add_button(label='<', callback=self.previous_page)
+                self.page_text = dpg.add_text()
+                dpg.add_button(label='>', callback=self.next_page)
+            with dpg.table(policy=dpg.mvTable_SizingStretchProp, sortable=True, sort_tristate=False,
+                           callback=self.sort) as self.table:
+                self.columns = {dpg.add_table_column(label=c, default_sort=c == order_by,
+                                                     prefer_sort_descending=c == order_by and descending): c
+                                for c in columns}
+                dpg.add_table_column(no_sort=True)
+
+    def fetch(self, limit: int, offset: int) -> List[Tuple]:
+        """Return the rows of the current page for the predicate, in the current order."""
+        raise NotImplementedError
+
+    def total(self) -> int:
+        """Return the number of rows for the predicate."""
+        raise NotImplementedError
+
+    def show(self, **predicate: Any) -> None:
+        """Show the first page of the rows selected by `predicate`."""
+        self.predicate = predicate
+        self.offset = 0
+        self.count = self.total()
+        self.update()
+
+    def show_error(self, message: str) -> None:
+        """Show no rows but the error message instead."""
+        self.predicate = None
+        self.count = 0
+        self.clear()
+        dpg.set_value(self.page_text, message)
+
+    def clear(self) -> None:
+        """Delete the rows shown."""
+        for row in dpg.get_item_children(self.table, 1):
+            dpg.delete_item(row)
+
+    def update(self) -> None:
+        """Query the current page again and show it."""
+        self.clear()
+        if self.predicate is None:
+            return
+
+        rows = self.fetch(self.page_size, self.offset)
+        for r in rows:
+            with dpg.table_row(parent=self.table):
+                for c in r:
+                    dpg.add_text(c)
+                dpg.add_button(label='Details', callback=self.details_clicked, user_data=r[0])
+        dpg.set_value(self.page_text, '{0}-{1} of {2}'.format(min(self.offset + 1, self.count),
+                                                              self.offset + len(rows), self.count))
+
+    def previous_page(self) -> None:
+        """Show the previous page if any."""
+        if self.offset > 0:
+            self.offset = max(self.offset - self.page_size, 0)
+            self.update()
+
+    def next_page(self) -> None:
+        """Show the next page if any."""
+        if self.offset + self.page_size < self.count:
+            self.offset += self.page_size
+            self.update()
+
+    def sort(self, sender: int, sort_specs: Any) -> None:
+        """Sort the rows by the column whose header was clicked, starting over from the first page."""
+        if not sort_specs:
+            return
+        column, direction = sort_specs[0]
+        self.order_by = self.columns[column]
+        self.descending = direction < 0
+        self.offset = 0
+        self.update()
+
+    def details_clicked(self, sender: int, app_data: Any, inhabitant_id: int) -> None:
+        """Show the details of the inhabitant of the row whose button was clicked."""
+        self.details(inhabitant_id)
+
+
+class InhabitantTable(PagedTable):
+    """Show the inhabitants selected by a predicate of game.query_inhabitant(), a page at a time."""
+
+    def __init__(self, details: Callable[[int], None], page_size: int = PAGE_SIZE) -> None:
+        """Create the empty table in the current container. The `Details` button of a row calls `details` with its inhabitant_id."""
+        super().__init__(game.INHABITANT_COLUMNS, details, 'inhabitant_id', page_size=page_size)
+
+    def fetch(self, limit: int, offset: int) -> List[Tuple]:
+        """Return the inhabitants of the current page."""
+        return game.query_inhabitant(order_by=self.order_by, descending=self.descending,
+                                     limit=limit, offset=offset, **self.predicate)[1]
+
+    def total(self) -> int:
+        """Return the number of inhabitants selected."""
+        return game.count_inhabitant(**self.predicate)
+
+
+class WitnessTable(PagedTable):
+    """Show the witness counts of the inhabitants in the vertex given to show() as `vertex_id`, a page at a time."""
+
+    def __init__(self, details: Callable[[int], None], page_size: int = PAGE_SIZE) -> None:
+        """Create the empty table in the current container, with the most seen inhabitants first."""
+        super().__init__(game.WITNESS_COLUMNS, details, 'count', descending=True, page_size=page_size)
+
+    def fetch(self, limit: int, offset: int) -> List[Tuple]:
+        """Return the witness counts of the current page."""
+        return game.query_witness_count(order_by=self.order_by, descending=self.descending,
+                                        limit=limit, offset=offset, **self.predicate)
+
+    def total(self) -> int:
+        """Return the number of inhabitants seen in the vertex."""
+        return game.count_witness(**self.predicate)
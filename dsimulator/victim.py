@@ -0,0 +1,188 @@
+"""
+Select the victims of the killers for the day.
+
+The potential victims are those whose visits overlap with the killer's at the same vertex,
+found by binary search of each of the killer's visits in a snapshot of the visits of the day sorted by vertex.
+The killers are ranked independently of each other, possibly in worker processes sharing the snapshot,
+and the conflicts between them are resolved afterwards in order of killer_id.
+
+The inhabitants are described by a feature matrix built once per game, with one row per inhabitant.
+For each killer, it is compared with the killer's own row to find the characteristics (`killer_chara`)
+that each inhabitant fulfills, and the characteristic weights are applied as a dot product.
+This gives a `(killer, inhabitant)` score matrix, so that scoring a potential victim is a lookup.
+"""
+
+import itertools
+import sqlite3
+import numpy as np
+from concurrent.futures import Executor
+from multiprocessing import shared_memory
+from typing import List, Sequence, Tuple
+
+# The columns of the feature matrix. A missing workplace is -1.
+FEATURES = ['male', 'income_level', 'home_building_id', 'workplace_id']
+
+# The columns of the characteristic matrices. Any other characteristic description is treated as "Relative".
+CHARACTERISTICS = ['low income', 'high income', 'neighbor', 'rapist', 'colleague', 'Relative']
+
+# The score of those who fulfill none of the characteristics of the killer and are not potential victims.
+NOT_ELIGIBLE = np.iinfo(np.int64).min
+
+Victim = Tuple[int, int, int, int]
+
+
+def chara_index(description: str) -> int:
+    """Return the column of the characteristic given its description."""
+    return CHARACTERISTICS.index(description if description in CHARACTERISTICS else 'Relative')
+
+
+def feature_matrix(con: sqlite3.Connection) -> np.ndarray:
+    """Return the feature matrix of the inhabitants, indexed by inhabitant_id. Rows without an inhabitant are -1."""
+    rows = np.array(con.execute('''SELECT inhabitant_id, gender = 'm', income_level, home_building_id, IFNULL(workplace_id, -1)
+                                     FROM inhabitant
+                                          JOIN home
+                                          USING(home_building_id)''').fetchall(), dtype=np.int64).reshape(-1, len(FEATURES) + 1)
+    features = np.full((rows[:, 0].max(initial=-1) + 1, len(FEATURES)), -1, dtype=np.int64)
+    features[rows[:, 0]] = rows[:, 1:]
+    return features
+
+
+def chara_matrix(con: sqlite3.Connection, features: np.ndarray, killer_inhabitant_id: int) -> np.ndarray:
+    """Return whether each inhabitant fulfills each characteristic with respect to the killer."""
+    male, income_level, home, workplace = features.T
+    killer = features[killer_inhabitant_id]
+    low, high = con.execute('SELECT MIN(income_level), MAX(income_level) FROM income_range').fetchone()
+    relatives = [r[0] for r in con.execute('''SELECT object_id
+                                                FROM relationship
+                                               WHERE subject_id = ? AND description = 'Relative\'''',
+                                           (killer_inhabitant_id,))]
+
+    match = np.zeros((len(features), len(CHARACTERISTICS)), dtype=bool)
+    match[:, chara_index('low income')] = income_level == low
+    match[:, chara_index('high income')] = income_level == high
+    match[:, chara_index('neighbor')] = home == killer[FEATURES.index('home_building_id')]
+    match[:, chara_index('rapist')] = male != killer[FEATURES.index('male')]
+    match[:, chara_index('colleague')] = (workplace == killer[FEATURES.index('workplace_id')]) & (workplace != -1)
+    match[relatives, chara_index('Relative')] = True
+    match[home == -1] = False
+    return match
+
+
+def chara_weights(con: sqlite3.Connection, killer_id: int) -> np.ndarray:
+    """Return the weight of each characteristic of the killer, where the missing ones weigh nothing."""
+    weights = np.zeros(len(CHARACTERISTICS), dtype=np.int64)
+    for description, weight in con.execute('SELECT chara_description, chara_weight FROM killer_chara WHERE killer_id = ?', (killer_id,)):
+        weights[chara_index(description)] += weight
+    return weights
+
+
+def score_matrix(con: sqlite3.Connection, features: np.ndarray, killers: Sequence[Tuple[int, int]]) -> np.ndarray:
+    """
+    Return the scores of the inhabitants as potential victims of the `(killer_id, killer_inhabitant_id)` killers.
+
+    The score is the sum of the weights of the characteristics fulfilled, or NOT_ELIGIBLE if none of them is,
+    as the victim must fulfill at least one characteristic of the killer. Killers are never potential victims.
+    """
+    match = np.stack([chara_matrix(con, features, i) for _, i in killers]).reshape(-1, len(features), len(CHARACTERISTICS))
+    weights = np.stack([chara_weights(con, k) for k, _ in killers]).reshape(-1, len(CHARACTERISTICS))
+
+    match = match.astype(np.int64)
+    scores = np.einsum('knc,kc->kn', match, weights)
+    eligible = np.einsum('knc,kc->kn', match, (weights != 0).astype(np.int64)) > 0
+    scores = np.where(eligible, scores, NOT_ELIGIBLE)
+    scores[:, [i for _, i in killers]] = NOT_ELIGIBLE
+    return scores
+
+
+def snapshot(visits: np.ndarray) -> np.ndarray:
+    """Return the visits `(inhabitant_id, vertex_id, arrive, leave)` of the day sorted by vertex, as searched by overlaps()."""
+    visits = visits.reshape(-1, 4)
+    return visits[np.lexsort((visits[:, 2], visits[:, 1]))]
+
+
+def overlaps(visits: np.ndarray, killer_inhabitant_id: int) -> np.ndarray:
+    """Return the `(inhabitant_id, vertex_id, start_min, end_min)` of the times that someone is at the same vertex as the killer."""
+    inhabitant, vertex, arrive, leave = visits.T
+    result = []
+    for _, v, a, b in visits[inhabitant == killer_inhabitant_id]:
+        lo, hi = np.searchsorted(vertex, [v, v + 1])
+        at = slice(lo, hi)
+        together = (arrive[at] <= b) & (leave[at] >= a) & (inhabitant[at] != killer_inhabitant_id)
+        result.append(np.stack([inhabitant[at], vertex[at], np.maximum(arrive[at], a), np.minimum(leave[at], b)], axis=1)[together])
+    return np.unique(np.concatenate(result).reshape(-1, 4) if result else np.empty((0, 4), dtype=np.int64), axis=0)
+
+
+def rank(candidates: np.ndarray, scores: np.ndarray, rng: np.random.Generator) -> List[Victim]:
+    """
+    Return the `(inhabitant_id, scene_vertex_id, min_of_death, weight_sum)` of the potential victims, the best first.
+
+    `candidates` are the overlaps with the killer and `scores` is the row of the killer in the score matrix.
+    Only those staying with the killer for at least a minute are considered, each inhabitant once.
+    Ties are broken randomly, and the minute of death is random within the time they are together.
+    """
+    inhabitant, vertex, start, end = candidates.reshape(-1, 4).T
+    keep = (end > start) & (scores[inhabitant] != NOT_ELIGIBLE)
+    inhabitant, vertex, start, end = inhabitant[keep], vertex[keep], start[keep], end[keep]
+    weight = scores[inhabitant]
+
+    order = np.lexsort((rng.random(len(weight)), -weight))
+    _, first = np.unique(inhabitant[order], return_index=True)
+    order = order[np.sort(first)]
+    min_of_death = start[order] + rng.integers(end[order] - start[order])
+    return list(zip(inhabitant[order].tolist(), vertex[order].tolist(), min_of_death.tolist(), weight[order].tolist()))
+
+
+def rank_shared(name: str, shape: Tuple[int, int], killer_inhabitant_id: int, scores: np.ndarray, seed: int) -> List[Victim]:
+    """Return rank() of the overlaps with the killer, for the snapshot of the visits in the shared memory `name`."""
+    shm = shared_memory.SharedMemory(name)
+    try:
+        visits = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+        candidates = overlaps(visits, killer_inhabitant_id)
+        del visits
+    finally:
+        shm.close()
+    return rank(candidates, scores, np.random.default_rng(seed))
+
+
+def resolve(rankings: Sequence[List[Victim]]) -> List[Victim]:
+    """
+    Return the victim of each killer given the rankings of the killers in order of killer_id, or None for those without any.
+
+    A potential victim of several killers is killed by the one with the lowest killer_id,
+    and the others take their best potential victim not taken yet.
+    """
+    taken = set()
+    victims = []
+    for ranking in rankings:
+        chosen = next((v for v in ranking if v[0] not in taken), None)
+        if chosen is not None:
+            taken.add(chosen[0])
+        victims.append(chosen)
+    return victims
+
+
+def select(visits: np.ndarray, killers: Sequence[Tuple[int, int]], scores: np.ndarray, rng: np.random.Generator,
+           executor: Executor = None) -> List[Victim]:
+    """
+    Return the victim of each of the `(killer_id, killer_inhabitant_id)` killers, in order of killer_id.
+
+    `visits` is the snapshot of the day and `scores` the score matrix with the killers in the same order.
+    Each killer is ranked independently with its own random seed drawn from `rng`, so the result does not
+    depend on whether the killers are ranked in `executor`, whose workers read the snapshot in shared memory.
+    """
+    seeds = rng.integers(np.iinfo(np.int64).max, size=len(killers)).tolist()
+    killer_inhabitant_ids = [i for _, i in killers]
+    if executor is None:
+        rankings = [rank(overlaps(visits, i), s, np.random.default_rng(seed))
+                    for i, s, seed in zip(killer_inhabitant_ids, scores, seeds)]
+        return resolve(rankings)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(visits.nbytes, 1))
+    try:
+        np.ndarray(visits.shape, dtype=np.int64, buffer=shm.buf)[:] = visits
+        rankings = list(executor.map(rank_shared, itertools.repeat(shm.name), itertools.repeat(visits.shape),
+                                     killer_inhabitant_ids, list(scores), seeds))
+    finally:
+        shm.close()
+        shm.unlink()
+    return resolve(rankings)
@@ -1,35 +1,47 @@
+/*
+The number of victims sharing each value of each attribute, maintained by a trigger as victims are only ever added,
+so that reading the common attributes does not aggregate all the victims again.
+Victims without a workplace are not counted, as they have no workplace building name.
+*/
+
+CREATE TABLE commonality_counts(
+	attribute_name  TEXT NOT NULL,
+	attribute_value TEXT NOT NULL,
+	attribute_cnt   INTEGER NOT NULL,
+	                PRIMARY KEY(attribute_name, attribute_value)
+);
+
+CREATE TRIGGER commonality_count AFTER INSERT ON victim
+BEGIN
+	INSERT INTO commonality_counts
+	SELECT attribute_name,
+	       CASE attribute_name
+	            WHEN 'name'                    THEN first_name
+	            WHEN 'home_building_name'      THEN h.building_name
+	            WHEN 'workplace_building_name' THEN w.building_name
+	            WHEN 'gender'                  THEN gender
+	            WHEN 'scene_vertex_id'         THEN CAST(NEW.scene_vertex_id AS TEXT)
+	            WHEN 'min_of_death'            THEN CAST(NEW.min_of_death AS TEXT)
+	            WHEN 'income_level'            THEN CAST(income_level AS TEXT)
+	       END AS attribute_value,
+	       1
+	  FROM inhabitant LEFT OUTER JOIN home USING(home_building_id)
+	       JOIN building AS h ON h.building_id = home_building_id
+	       JOIN workplace USING(workplace_id)
+	       JOIN building AS w ON w.building_id = workplace_building_id,
+	       (SELECT 'name' AS attribute_name
+	        UNION ALL SELECT 'home_building_name'
+	        UNION ALL SELECT 'workplace_building_name'
+	        UNION ALL SELECT 'gender'
+	        UNION ALL SELECT 'scene_vertex_id'
+	        UNION ALL SELECT 'min_of_death'
+	        UNION ALL SELECT 'income_level')
+	 WHERE inhabitant_id = NEW.victim_id AND attribute_value IS NOT NULL
+	    ON CONFLICT DO UPDATE SET attribute_cnt = attribute_cnt + 1;
+END;
+
 CREATE VIEW commonality AS
-WITH victim_info AS(
-    SELECT first_name,
-	h.building_name AS home_building_name,
-	w.building_name AS workplace_building_name,
-	gender,
-	scene_vertex_id,
-	min_of_death,
-	income_level
-	FROM inhabitant LEFT OUTER JOIN home USING(home_building_id)
-	JOIN building AS h ON h.building_id = home_building_id
-	JOIN workplace USING(workplace_id)
-	JOIN building AS w ON w.building_id = workplace_building_id
-	, victim
-    WHERE inhabitant_id = victim_id
-)
-SELECT attribute_name, attribute_value, COUNT(*) AS attribute_cnt
-FROM (
-    SELECT 'name' AS attribute_name, first_name AS attribute_value FROM victim_info
-    UNION ALL
-    SELECT 'home_building_name', home_building_name FROM victim_info
-    UNION ALL
-    SELECT 'workplace_building_name', workplace_building_name FROM victim_info
-    UNION ALL
-    SELECT 'gender', gender FROM victim_info
-    UNION ALL
-    SELECT 'scene_vertex_id', CAST(scene_vertex_id AS TEXT) FROM victim_info
-    UNION ALL
-    SELECT 'min_of_death', CAST(min_of_death AS TEXT) FROM victim_info
-    UNION ALL
-    SELECT 'income_level', CAST(income_level AS TEXT) FROM victim_info
-) AS attributes
-GROUP BY attribute_name, attribute_value
-HAVING COUNT(*) >= 3
+SELECT attribute_name, attribute_value, attribute_cnt
+FROM commonality_counts
+WHERE attribute_cnt >= 3
 ORDER BY attribute_cnt DESC;
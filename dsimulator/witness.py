@@ -0,0 +1,52 @@
+"""
+Count how many times each inhabitant has been seen at each vertex, for all vertices at once.
+
+An inhabitant is seen by another one when their visits to the same vertex overlap in time.
+Instead of joining the visits pairwise, the arrive and leave times of the visits are sorted once
+per vertex, and the number of visits overlapping with `[arrive, leave]` is found by binary search:
+the visits arriving no later than `leave`, minus those having left before `arrive`.
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+# The minute at which the day ends, until which the visits without a leaving time last.
+DAY_END = 24 * 60
+
+
+def overlap_count(group: np.ndarray, arrive: np.ndarray, leave: np.ndarray,
+                  q_group: np.ndarray, q_arrive: np.ndarray, q_leave: np.ndarray) -> np.ndarray:
+    """Return, for each query interval, the number of intervals in the same group overlapping with it."""
+    span = max(leave.max(initial=0), q_leave.max(initial=0)) + 1
+    arrive_key = np.sort(group * span + arrive)
+    leave_key = np.sort(group * span + leave)
+    base = q_group * span
+
+    arrived = np.searchsorted(arrive_key, base + q_leave, 'right') - np.searchsorted(arrive_key, base, 'left')
+    left = np.searchsorted(leave_key, base + q_arrive, 'left') - np.searchsorted(leave_key, base, 'left')
+    return arrived - left
+
+
+def count(visits: np.ndarray, dead: np.ndarray, min_of_death: np.ndarray) -> List[Tuple[int, int, int]]:
+    """
+    Return the `(vertex_id, inhabitant_id, count)` tuples with a positive count.
+
+    `visits` has the rows `(inhabitant_id, vertex_id, arrive, leave)`, with DAY_END for an unknown leaving time.
+    `dead` and `min_of_death` are indexed by inhabitant_id; the latter is only used for the dead.
+    Only the visits of living inhabitants are counted, and a dead inhabitant is only seen until the time of death.
+    """
+    inhabitant, vertex, arrive, leave = visits.reshape(-1, 4).T
+
+    seen = ~dead[inhabitant] | (arrive <= min_of_death[inhabitant])
+    seeing = ~dead[inhabitant]
+
+    # Count the overlapping visits at the same vertex, then remove those of the inhabitant themselves.
+    pairs, pair = np.unique(np.stack([vertex, inhabitant]), axis=1, return_inverse=True)
+    pair = pair.ravel()
+    c = overlap_count(vertex[seeing], arrive[seeing], leave[seeing], vertex[seen], arrive[seen], leave[seen]) \
+        - overlap_count(pair[seeing], arrive[seeing], leave[seeing], pair[seen], arrive[seen], leave[seen])
+
+    # Sum up the counts of the visits of the same inhabitant to the same vertex.
+    total = np.bincount(pair[seen], weights=c, minlength=pairs.shape[1]).astype(np.int64)
+    keep = total > 0
+    return list(zip(pairs[0, keep].tolist(), pairs[1, keep].tolist(), total[keep].tolist()))
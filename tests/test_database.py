@@ -0,0 +1,52 @@
+"""Run some tests on the database module."""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import pytest
+import dsimulator.database as database
+
+
+def test_connection_manager() -> None:
+    """Check that the readers only see committed changes, cannot write, and wait for the writer."""
+    with tempfile.TemporaryDirectory() as save_dir:
+        db = database.ConnectionManager(os.path.join(save_dir, 'saves', 'save.db'))
+        con = db.open()
+        with db.writer():
+            con.execute('CREATE TABLE t(x INTEGER)')
+            con.execute('INSERT INTO t VALUES (1)')
+            # A writer may call other writers and read with its own connection.
+            with db.writer(), db.reader() as read_con:
+                assert read_con is con
+
+        with db.reader() as read_con:
+            assert read_con is not con
+            assert read_con.execute('SELECT x FROM t').fetchall() == [(1,)]
+            with pytest.raises(sqlite3.OperationalError):
+                read_con.execute('INSERT INTO t VALUES (2)')
+
+        # The reader in the other thread only gets the read lock after the writer has committed.
+        result = []
+
+        def read() -> None:
+            """Read the table from another thread."""
+            with db.reader() as read_con:
+                result.extend(read_con.execute('SELECT x FROM t'))
+
+        with db.writer():
+            con.execute('INSERT INTO t VALUES (2)')
+            reader = threading.Thread(target=read)
+            reader.start()
+            reader.join(0.1)
+            assert reader.is_alive()
+        reader.join()
+        assert result == [(1,), (2,)]
+
+        with db.save_list() as list_con:
+            list_con.execute('INSERT INTO save DEFAULT VALUES')
+        with db.save_list() as same_con:
+            assert same_con is list_con
+            assert same_con.execute('SELECT save_id FROM save').fetchall() == [(1,)]
+        db.save_con.close()
+        db.close()
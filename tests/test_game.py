@@ -1,6 +1,12 @@
 """Run some tests on the game module."""
 
+import collections
+import concurrent.futures
+import re
+import sqlite3
+import pytest
 import dsimulator.game as game
+import dsimulator.query as query
 
 game.init_game()
 
@@ -38,3 +44,324 @@ print(cur.fetchall())
 cur = game.con.execute('SELECT * FROM loc_time LIMIT 10')
 print('loc_time:')
 print(cur.fetchall())
+
+
+def test_graph_version() -> None:
+    """Check that `dist` is only rebuilt when the lockdown status has changed."""
+    game.query_shortest_path()
+    version = game.dist_version
+    game.query_shortest_path()
+    assert game.dist_version == version
+
+    building_id = game.list_building()[0][2]
+    game.toggle_lockdown(building_id)
+    game.query_shortest_path()
+    assert game.dist_version == (version[0] + 1, version[1])
+    assert game.con.execute('SELECT COUNT(*) FROM dist WHERE dst = ? AND src <> dst AND d IS NOT NULL',
+                            (building_id,)).fetchone()[0] == 0
+
+    game.toggle_lockdown(building_id)
+    game.query_shortest_path()
+    assert game.dist_version == (version[0] + 2, version[1])
+
+
+def test_witness_count() -> None:
+    """Check the precomputed witness counts against a plain self-join of `loc_time`, including visits never left."""
+    with game.db.writer():
+        vertex_id, arrive = game.con.execute('SELECT vertex_id, MIN(arrive) FROM loc_time').fetchone()
+        inhabitant_id = game.con.execute('SELECT inhabitant_id FROM inhabitant WHERE NOT dead').fetchone()[0]
+        game.con.execute('INSERT INTO loc_time VALUES (?, ?, ?, NULL, ?, 1140)', (inhabitant_id, vertex_id, arrive + 1, vertex_id))
+    game.query_witness_count_table()
+    assert inhabitant_id in [r[0] for r in game.query_witness_count(vertex_id)]
+    for vertex_id, in game.con.execute('SELECT DISTINCT vertex_id FROM loc_time ORDER BY leave IS NOT NULL LIMIT 10').fetchall():
+        expected = game.con.execute('''SELECT a.inhabitant_id, COUNT(*)
+                                         FROM loc_time AS a
+                                              JOIN loc_time AS b
+                                              ON a.vertex_id = b.vertex_id AND a.inhabitant_id <> b.inhabitant_id
+                                                 AND a.arrive <= COALESCE(b.leave, 1440) AND b.arrive <= COALESCE(a.leave, 1440)
+                                              JOIN inhabitant AS a_info
+                                              ON a_info.inhabitant_id = a.inhabitant_id
+                                              JOIN inhabitant AS b_info
+                                              ON b_info.inhabitant_id = b.inhabitant_id
+                                        WHERE a.vertex_id = ? AND b_info.dead = FALSE
+                                              AND (a_info.dead = FALSE OR a.arrive <=
+                                                   (SELECT min_of_death FROM victim WHERE victim_id = a.inhabitant_id))
+                                     GROUP BY a.inhabitant_id''', (vertex_id,)).fetchall()
+        assert sorted((r[0], r[3]) for r in game.query_witness_count(vertex_id)) == sorted(expected)
+
+    with game.db.writer():
+        game.con.execute('DELETE FROM loc_time WHERE leave IS NULL AND inhabitant_id = ? AND arrive = ?', (inhabitant_id, arrive + 1))
+    game.query_witness_count_table()
+
+
+def test_query_witness_count_pages() -> None:
+    """Check that the pages of witness counts put together are all of them, in order, and that they are counted."""
+    vertex_id = game.con.execute('SELECT vertex_id FROM witness_count GROUP BY vertex_id ORDER BY COUNT(*) DESC').fetchone()[0]
+    everyone = game.query_witness_count(vertex_id)
+    assert game.count_witness(vertex_id) == len(everyone) > 10
+    assert [r[3] for r in everyone] == sorted((r[3] for r in everyone), reverse=True)
+    pages = [game.query_witness_count(vertex_id, limit=10, offset=offset) for offset in range(0, len(everyone), 10)]
+    assert [r for page in pages for r in page] == everyone
+    by_name = game.query_witness_count(vertex_id, order_by='last_name', descending=False)
+    assert [(r[2], r[0]) for r in by_name] == sorted((r[2], r[0]) for r in everyone)
+    with pytest.raises(ValueError):
+        game.query_witness_count(vertex_id, order_by='count; DROP TABLE inhabitant')
+
+
+def test_profiling() -> None:
+    """Check that the profiled functions are only recorded while profiling is on, with the changes of the writers only."""
+    game.perf_log.clear()
+    game.query_witness_count(0)
+    assert len(game.perf_log) == 0
+
+    game.set_profiling(True)
+    try:
+        rows = game.query_witness_count(0)
+        game.query_building_summary(game.list_building()[0][2])
+        game.query_witness_count_table()
+    finally:
+        game.set_profiling(False)
+
+    assert [r.name for r in game.perf_log] == ['query_witness_count', 'query_building_summary', 'query_witness_count_table']
+    assert game.perf_log[0].rows == len(rows)
+    assert game.perf_log[1].args == str(game.list_building()[0][2])
+    # A reader does not take the changes made by the writer meanwhile as its own.
+    assert game.perf_log[0].changes is None and game.perf_log[1].changes is None
+    assert game.perf_log[2].changes > 0
+
+
+def test_start_next_day() -> None:
+    """Check that a turn computed in the background is swapped in when done, and leaves no trace when cancelled."""
+    day = game.day
+    with game.db.writer():
+        # The turn cannot start while the write lock is held, so it is cancelled before its first phase.
+        turn = game.start_next_day()
+        turn.cancel()
+    with pytest.raises(game.TurnCancelled):
+        turn.future.result()
+    assert game.day == day
+    assert game.con.execute('SELECT day FROM status').fetchone()[0] == day
+
+    turn = game.start_next_day()
+    turn.future.result()
+    assert (turn.phase, turn.fraction) == ('Done', 1.0)
+    assert game.day == day + 1
+    with game.db.reader() as read_con:
+        assert read_con.execute('SELECT day FROM status').fetchone()[0] == day + 1
+        assert read_con.execute('SELECT COUNT(*) FROM src_dst').fetchone()[0] > 0
+
+
+def test_query_inhabitant_pages() -> None:
+    """Check that the pages of a sorted query make up the whole query, and that the count matches."""
+    _, rows = game.query_inhabitant(order_by='last_name', descending=True, dead=False)
+    assert game.count_inhabitant(dead=False) == len(rows)
+    assert [r[2] for r in rows] == sorted((r[2] for r in rows), reverse=True)
+
+    pages = []
+    for offset in range(0, len(rows), 64):
+        pages += game.query_inhabitant(order_by='last_name', descending=True, limit=64, offset=offset, dead=False)[1]
+    assert pages == rows
+
+    with pytest.raises(ValueError):
+        game.query_inhabitant(order_by='inhabitant_id; DROP TABLE inhabitant')
+
+
+def test_query_inhabitant_parameters() -> None:
+    """Check that the filters are bound as parameters, so that the searches of the same shape share their SQL."""
+    shape, parameters = game.inhabitant_filter(home_building_name="O'Brien", dead=False, suspect=True)
+    assert parameters == [False, "O'Brien"]
+    assert game.query_inhabitant(home_building_name="O'Brien", dead=False, suspect=True)[1] == []
+    assert query.select_inhabitant(shape, 'last_name', False) \
+        is query.select_inhabitant(game.inhabitant_filter(home_building_name='Home', dead=True, suspect=True)[0], 'last_name', False)
+
+    x, y, building_id, building_name, lockdown = game.list_building()[0]
+    expected = game.con.execute('SELECT inhabitant_id FROM inhabitant WHERE home_building_id = ? OR workplace_id IN '
+                                '(SELECT workplace_id FROM workplace WHERE workplace_building_id = ?)',
+                                (building_id, building_id)).fetchall()
+    found = game.query_inhabitant(home_building_name=building_name)[1] + game.query_inhabitant(workplace_building_id=building_id)[1]
+    assert sorted(r[0] for r in found) == sorted(r[0] for r in expected)
+
+
+def test_query_plans() -> None:
+    """Check that the queries made by the UI for a single item never scan a large table."""
+    large = {'inhabitant', 'relationship', 'workplace', 'loc_time', 'dist', 'witness_count'}
+    building_id = game.list_building()[0][2]
+    inhabitant_id = game.query_inhabitant(limit=1)[1][0][0]
+    with game.db.writer() as write_con:
+        statements = []
+        write_con.set_trace_callback(statements.append)
+        try:
+            game.query_inhabitant_detail(inhabitant_id)
+            game.query_inhabitant_relationship(inhabitant_id)
+            game.query_witness_count(building_id)
+            game.query_via_point_constraint(0, 1, 100)
+            game.query_inhabitant(home_building_id=building_id)
+            game.query_inhabitant(workplace_building_id=building_id)
+            game.query_inhabitant(income_lo=10000, income_hi=10000)
+            game.query_inhabitant(suspect=True)
+        finally:
+            write_con.set_trace_callback(None)
+
+        for statement in statements:
+            # The plans name the tables by their alias if any.
+            aliases = dict((alias, table) for table, alias in re.findall(r'(\w+)\s+AS\s+(\w+)', statement, re.IGNORECASE))
+            for _, _, _, detail in write_con.execute('EXPLAIN QUERY PLAN ' + statement):
+                scan = re.match(r'SCAN (\w+)', detail)
+                assert not (scan and aliases.get(scan[1], scan[1]) in large), (statement, detail)
+
+
+def test_commonality() -> None:
+    """Check the common attributes counted as victims are added against an aggregation of all the victims."""
+    alive = game.query_inhabitant(dead=False, limit=12)[1]
+    for i, r in enumerate(alive):
+        game.kill_inhabitant((r[0], i % 2, 600 + i % 3))
+
+    counts = game.con.execute('''SELECT first_name, h.building_name, w.building_name, gender,
+                                         scene_vertex_id, min_of_death, income_level
+                                    FROM victim
+                                         JOIN inhabitant
+                                         ON inhabitant_id = victim_id
+                                         JOIN home USING(home_building_id)
+                                         JOIN building AS h ON h.building_id = home_building_id
+                                         JOIN workplace USING(workplace_id)
+                                         JOIN building AS w ON w.building_id = workplace_building_id''').fetchall()
+    names = ['name', 'home_building_name', 'workplace_building_name', 'gender', 'scene_vertex_id', 'min_of_death', 'income_level']
+    expected = collections.Counter((name, str(value)) for r in counts for name, value in zip(names, r))
+    assert {(n, v): c for n, v, c in game.con.execute('SELECT * FROM commonality_counts')} == expected
+
+    common = game.query_victim_commonality()
+    assert sorted(common) == sorted((n, v, c) for (n, v), c in expected.items() if c >= 3)
+    assert [r[2] for r in common] == sorted((r[2] for r in common), reverse=True)
+
+
+def test_save(tmp_path, monkeypatch) -> None:
+    """Check that a save only has the rows of the tables that are not caches, and that reading it restores the game."""
+    monkeypatch.setattr(game, 'SAVE_DIR', str(tmp_path))
+    monkeypatch.setattr(game.db, 'save_list_path', str(tmp_path / 'save.db'))
+    monkeypatch.setattr(game.db, 'save_con', None)
+
+    def dump():
+        with game.db.reader() as read_con:
+            tables = [r[0] for r in read_con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            return {t: sorted(read_con.execute('SELECT * FROM "{0}"'.format(t)).fetchall(), key=repr) for t in tables}
+
+    game.write_save(1)
+    game.toggle_lockdown(game.list_building()[0][2])
+    game.next_day()
+    game.write_save(1)
+    expected = dump()
+
+    save_con = sqlite3.connect(game.to_save_path(1))
+    for table, rows in expected.items():
+        saved = sorted(save_con.execute('SELECT * FROM "{0}"'.format(table)).fetchall(), key=repr)
+        assert saved == ([] if table in game.CACHE_TABLES else rows), table
+    save_con.close()
+
+    # The constraints of the paths are only used while they are generated.
+    del expected['src_dst']
+    game.read_save(1)
+    game.query_via_point_constraint(0, 1, 100)
+    restored = dump()
+    del restored['src_dst']
+    assert restored == expected
+
+
+def test_save_dirty_tables(tmp_path, monkeypatch) -> None:
+    """Check that saving again only writes the tables changed since, and writes the save from scratch if most are."""
+    monkeypatch.setattr(game, 'SAVE_DIR', str(tmp_path))
+    monkeypatch.setattr(game.db, 'save_list_path', str(tmp_path / 'save.db'))
+    monkeypatch.setattr(game.db, 'save_con', None)
+    game.write_save(1)
+
+    saved = []
+    save_table = game.save_table
+    monkeypatch.setattr(game, 'save_table', lambda con, table: saved.append(table) or save_table(con, table))
+    copied = []
+    copy_table = game.copy_table
+    monkeypatch.setattr(game, 'copy_table', lambda con, table: copied.append(table) or copy_table(con, table))
+
+    game.write_save(1)
+    assert saved == [] and copied == []
+
+    game.toggle_lockdown(game.list_building()[0][2])
+    game.write_save(1)
+    assert saved == ['building'] + game.TRIGGER_TABLES and copied == []
+
+    saved.clear()
+    with game.db.writer():
+        game.con.execute('UPDATE relationship SET description = description')
+    game.write_save(1)
+    assert saved == [] and 'relationship' in copied
+
+
+def test_read_incompatible_save(tmp_path, monkeypatch) -> None:
+    """Check that a save of another version or a missing save is refused before the game state is changed."""
+    monkeypatch.setattr(game, 'SAVE_DIR', str(tmp_path))
+    monkeypatch.setattr(game.db, 'save_list_path', str(tmp_path / 'save.db'))
+    monkeypatch.setattr(game.db, 'save_con', None)
+    game.write_save(1)
+    save_con = sqlite3.connect(game.to_save_path(1))
+    assert save_con.execute('PRAGMA user_version').fetchone()[0] == game.SAVE_VERSION
+    # A save of the original format, without a version nor the tables added since.
+    save_con.execute('PRAGMA user_version = 0')
+    save_con.execute('DROP TABLE graph_version')
+    save_con.close()
+
+    uri = game.db.uri
+    with pytest.raises(game.SaveError):
+        game.read_save(1)
+    with pytest.raises(game.SaveError):
+        game.read_save(2)
+    assert game.db.uri == uri
+    assert game.count_inhabitant() > 0
+
+
+def test_speculation(monkeypatch) -> None:
+    """Check that the day computed in advance is the day computed normally, and that it is discarded when stale."""
+    def outcome():
+        with game.db.reader() as read_con:
+            return (game.day, game.rng.bit_generator.state,
+                    read_con.execute('SELECT * FROM victim ORDER BY victim_id').fetchall(),
+                    read_con.execute('SELECT * FROM loc_time ORDER BY inhabitant_id, arrive').fetchall(),
+                    read_con.execute('SELECT * FROM witness_count ORDER BY vertex_id, inhabitant_id').fetchall())
+
+    game.init_game(seed=1)
+    game.next_day()
+    expected = outcome()
+
+    game.set_speculation(True)
+    try:
+        game.init_game(seed=1)
+        # A day not computed yet is not waited for.
+        assert not game.speculation.done() and not game.commit_speculation()
+        assert game.speculation is None and game.day == 1
+
+        # A newer speculation supersedes the older one, which does not compute its day.
+        game.speculate()
+        first = game.speculation
+        game.speculate()
+        try:
+            assert first.result() is None
+        except (concurrent.futures.CancelledError, game.TurnCancelled):
+            pass
+        game.speculation.result()
+        assert game.commit_speculation()
+        assert outcome() == expected
+
+        # A burst of changes only copies the game state once.
+        copies = []
+        serialize = game.db.serialize
+        monkeypatch.setattr(game.db, 'serialize', lambda: copies.append(None) or serialize())
+        for _ in range(5):
+            game.speculate()
+        game.speculation.result()
+        assert len(copies) == 1
+
+        # Any change to the game state makes the day computed in advance stale.
+        game.speculate()
+        game.speculation.result()
+        with game.db.writer():
+            game.con.execute('UPDATE building SET lockdown = 1 - lockdown WHERE building_id = 0')
+        assert not game.commit_speculation()
+    finally:
+        game.set_speculation(False)
@@ -0,0 +1,48 @@
+"""Run some tests on the generator module."""
+
+import random
+import sqlite3
+import numpy as np
+import pytest
+import dsimulator.game as game
+import dsimulator.generator as gen
+
+
+def test_random_other() -> None:
+    """Check that only the integers left are returned, even when a single one is, and that none left is an error."""
+    random.seed(0)
+    assert {gen.random_other(5, {0, 2, 4, 7}) for _ in range(100)} == {1, 3}
+    assert gen.random_other(3, {0, 1}) == 2
+    with pytest.raises(ValueError):
+        gen.random_other(3, {0, 1, 2})
+
+
+def test_too_few_inhabitants() -> None:
+    """Check that a town too small for everyone to have an enemy and a friend is an error rather than a hang."""
+    con = sqlite3.connect(':memory:')
+    for statement in game.SCRIPTS['DDL.sql']:
+        con.execute(statement)
+    gen.generate_map(con, 10, 10, np.random.default_rng(0))
+    allocator = gen.BuildingAllocator(con)
+    gen.generate_home(con, allocator=allocator)
+    gen.generate_workplace(con, allocator=allocator)
+
+    with pytest.raises(ValueError):
+        gen.generate_inhabitants_and_relationships(con, 3)
+    assert con.execute('SELECT COUNT(*) FROM inhabitant').fetchone()[0] == 0
+    gen.generate_inhabitants_and_relationships(con, 20)
+
+
+def test_map_too_small() -> None:
+    """Check that a map with fewer vertices than buildings is an error rather than a crash while placing them."""
+    with pytest.raises(ValueError):
+        game.init_game(width=5, height=5)
+
+    con = sqlite3.connect(':memory:')
+    for statement in game.SCRIPTS['DDL.sql']:
+        con.execute(statement)
+    gen.generate_map(con, 5, 5, np.random.default_rng(0))
+    allocator = gen.BuildingAllocator(con)
+    gen.generate_home(con, allocator=allocator)
+    with pytest.raises(ValueError):
+        gen.generate_workplace(con, allocator=allocator)
@@ -0,0 +1,42 @@
+"""Run some tests on the itinerary module."""
+
+import sqlite3
+import numpy as np
+import dsimulator.pathfinding as pathfinding
+import dsimulator.itinerary as itinerary
+
+
+def test_generate() -> None:
+    """Check that every generated path follows the edges and satisfies its time constraint."""
+    rng = np.random.default_rng(0)
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE vertex(vertex_id INTEGER PRIMARY KEY, x REAL, y REAL)')
+    con.execute('CREATE TABLE edge(start INTEGER, end INTEGER, cost_min INTEGER)')
+    con.executemany('INSERT INTO vertex VALUES (?, 0, 0)', [(i,) for i in range(25)])
+    for v in range(25):
+        for u in (v + 1, v + 5):
+            if u < 25 and (u == v + 5 or u % 5 != 0):
+                c = int(rng.integers(10, 20))
+                con.executemany('INSERT INTO edge VALUES (?, ?, ?)', [(v, u, c), (u, v, c)])
+    graph = pathfinding.load_adjacency(con)
+    d = pathfinding.all_pairs(*graph[1:])
+    cost = {(s, e): c for s, e, c in con.execute('SELECT * FROM edge')}
+
+    legs = [(i, int(rng.integers(0, 25)), int(rng.integers(0, 25)), 420, 600) for i in range(200)]
+    legs.append((200, 0, 24, 420, 421))
+    rows = itinerary.generate(legs, graph, d, rng)
+
+    paths = {}
+    for r in rows:
+        paths.setdefault(r[0], []).append(r)
+    for i, src, dst, t_src, t_dst in legs[:-1]:
+        path = paths[i]
+        assert path[0][1:3] == (src, t_src)
+        assert path[-1][1] == dst
+        assert path[-1][3] <= t_dst
+        for a, b in zip(path, path[1:]):
+            assert a[2] <= a[3]
+            assert b[2] == a[3] + cost[a[1], b[1]]
+
+    # The destination cannot be reached in time.
+    assert paths[200] == [(200, 0, 420, None, 24, 421)]
@@ -0,0 +1,99 @@
+"""Run some tests on the pathfinding module."""
+
+import sqlite3
+import numpy as np
+import dsimulator.pathfinding as pathfinding
+
+
+def make_graph() -> sqlite3.Connection:
+    """Create a small graph: a directed square 0 -> 1 -> 2 -> 3 -> 0 with a shortcut 0 -> 2 and an isolated vertex 4."""
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE vertex(vertex_id INTEGER PRIMARY KEY, x REAL, y REAL)')
+    con.execute('CREATE TABLE edge(start INTEGER, end INTEGER, cost_min INTEGER)')
+    con.executemany('INSERT INTO vertex VALUES (?, 0, 0)', [(i,) for i in range(5)])
+    con.executemany('INSERT INTO edge VALUES (?, ?, ?)', [(0, 1, 1), (1, 2, 1), (2, 3, 1), (3, 0, 1), (0, 2, 5)])
+    return con
+
+
+def test_all_pairs() -> None:
+    """Check the distances against hand-computed ones, including unreachable pairs."""
+    con = make_graph()
+    vertex_ids, indptr, indices, weights = pathfinding.load_adjacency(con, 'edge')
+    d = pathfinding.all_pairs(indptr, indices, weights)
+
+    assert vertex_ids.tolist() == [0, 1, 2, 3, 4]
+    assert d[0].tolist() == [0, 1, 2, 3, np.inf]
+    assert d[3].tolist() == [1, 2, 3, 0, np.inf]
+    assert d[4].tolist() == [np.inf, np.inf, np.inf, np.inf, 0]
+
+
+def test_write_dist() -> None:
+    """Check that unreachable pairs are written as NULL and not visited."""
+    con = make_graph()
+    con.execute('CREATE TABLE dist(src INTEGER, dst INTEGER, d INTEGER, visited INTEGER)')
+    vertex_ids, indptr, indices, weights = pathfinding.load_adjacency(con, 'edge')
+    pathfinding.write_dist(con, vertex_ids, pathfinding.all_pairs(indptr, indices, weights))
+
+    assert con.execute('SELECT COUNT(*) FROM dist').fetchone()[0] == 25
+    assert con.execute('SELECT d, visited FROM dist WHERE src = 1 AND dst = 0').fetchone() == (3, 1)
+    assert con.execute('SELECT d, visited FROM dist WHERE src = 0 AND dst = 4').fetchone() == (None, 0)
+
+
+def make_grid(rng: np.random.Generator) -> sqlite3.Connection:
+    """Create a 6x6 grid of vertices 0-35 with random costs both ways, and two more vertices 36 <-> 37 apart from it."""
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE vertex(vertex_id INTEGER PRIMARY KEY, x REAL, y REAL)')
+    con.execute('CREATE TABLE edge(start INTEGER, end INTEGER, cost_min INTEGER)')
+    con.executemany('INSERT INTO vertex VALUES (?, 0, 0)', [(i,) for i in range(38)])
+    for v in range(36):
+        for u in (v + 1, v + 6):
+            if u < 36 and (u == v + 6 or u % 6 != 0):
+                con.execute('INSERT INTO edge VALUES (?, ?, ?)', (v, u, int(rng.integers(1, 10))))
+                con.execute('INSERT INTO edge VALUES (?, ?, ?)', (u, v, int(rng.integers(1, 10))))
+    con.executemany('INSERT INTO edge VALUES (?, ?, 1)', [(36, 37), (37, 36)])
+    return con
+
+
+def test_lock_vertex_repairs_few_sources(monkeypatch) -> None:
+    """Check that locking a corner only searches again from the few sources whose shortest paths went through it."""
+    rng = np.random.default_rng(1)
+    _, indptr, indices, weights = pathfinding.load_adjacency(make_grid(rng))
+    reverse = pathfinding.reverse_adjacency(indptr, indices, weights)
+    blocked = np.zeros(38, dtype=bool)
+    d = pathfinding.all_pairs(indptr, indices, weights, blocked)
+
+    sources = []
+    repair_source = pathfinding.repair_source
+
+    def counting_repair_source(row, graph, blocked, affected):
+        sources.append(int(np.flatnonzero(row == 0)[0]))
+        return repair_source(row, graph, blocked, affected)
+
+    monkeypatch.setattr(pathfinding, 'repair_source', counting_repair_source)
+    pathfinding.lock_vertex(d, indptr, indices, weights, reverse, blocked, 0)
+
+    # The unreachable pairs, such as from the vertices apart from the grid, are not taken as going through the corner.
+    assert 36 not in sources and 37 not in sources
+    assert len(sources) < len(d) // 4
+    assert (d == pathfinding.all_pairs(indptr, indices, weights, blocked)).all()
+
+
+def test_update_blocked() -> None:
+    """Check that toggling lockdowns incrementally gives the same distances as recomputing from scratch."""
+    rng = np.random.default_rng(0)
+    _, indptr, indices, weights = pathfinding.load_adjacency(make_grid(rng))
+    reverse = pathfinding.reverse_adjacency(indptr, indices, weights)
+
+    blocked = np.zeros(38, dtype=bool)
+    d = pathfinding.all_pairs(indptr, indices, weights, blocked)
+    for _ in range(20):
+        new_blocked = blocked.copy()
+        new_blocked[rng.integers(0, 38, 2)] ^= True
+        old = d.copy()
+        changed = pathfinding.update_blocked(d, indptr, indices, weights, reverse, blocked, new_blocked)
+
+        assert (blocked == new_blocked).all()
+        assert (d == pathfinding.all_pairs(indptr, indices, weights, blocked)).all()
+        mask = np.zeros(d.shape, dtype=bool)
+        mask[changed] = True
+        assert mask[d != old].all()
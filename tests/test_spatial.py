@@ -0,0 +1,30 @@
+"""Run some tests on the spatial module."""
+
+import numpy as np
+import dsimulator.ui.spatial as spatial
+
+
+def test_grid_index() -> None:
+    """Check the items found in the grid against a linear scan of their boxes."""
+    rng = np.random.default_rng(0)
+    boxes = []
+    index = spatial.GridIndex(50)
+    for key in range(300):
+        x, y = rng.uniform(-500, 500, size=2)
+        w, h = rng.uniform(0, 120, size=2)
+        boxes.append((x, y, x + w, y + h))
+        index.insert(boxes[-1], key)
+
+    for x, y in rng.uniform(-550, 550, size=(1000, 2)):
+        expected = [k for k, b in enumerate(boxes) if b[0] <= x <= b[2] and b[1] <= y <= b[3]]
+        assert index.query(x, y) == expected
+
+    index.clear()
+    assert index.query(*boxes[0][:2]) == []
+
+
+def test_segment_distance() -> None:
+    """Check the distance to a segment beside it and beyond its ends."""
+    assert spatial.segment_distance(5, 3, (0, 0), (10, 0)) == 3
+    assert spatial.segment_distance(13, 4, (0, 0), (10, 0)) == 5
+    assert spatial.segment_distance(1, 1, (0, 0), (0, 0)) == np.hypot(1, 1)
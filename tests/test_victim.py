@@ -0,0 +1,57 @@
+"""Run some tests on the victim module."""
+
+import concurrent.futures
+import multiprocessing
+import sqlite3
+import numpy as np
+import dsimulator.victim as victim
+
+
+def test_score_matrix() -> None:
+    """Check the scores of the inhabitants as potential victims of two killers."""
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE income_range(income_level INTEGER)')
+    con.execute('CREATE TABLE home(home_building_id INTEGER, income_level INTEGER)')
+    con.execute('CREATE TABLE inhabitant(inhabitant_id INTEGER, home_building_id INTEGER, workplace_id INTEGER, gender TEXT)')
+    con.execute('CREATE TABLE relationship(subject_id INTEGER, object_id INTEGER, description TEXT)')
+    con.execute('CREATE TABLE killer_chara(killer_id INTEGER, chara_description TEXT, chara_weight INTEGER)')
+    con.executemany('INSERT INTO income_range VALUES (?)', [(1,), (2,), (3,)])
+    con.executemany('INSERT INTO home VALUES (?, ?)', [(10, 1), (11, 2), (12, 3)])
+    con.executemany('INSERT INTO inhabitant VALUES (?, ?, ?, ?)',
+                    [(0, 10, 20, 'm'), (1, 10, None, 'f'), (2, 11, 20, 'm'), (3, 12, 21, 'f'), (4, 11, None, 'm')])
+    con.execute("INSERT INTO relationship VALUES (4, 2, 'Relative')")
+    con.executemany('INSERT INTO killer_chara VALUES (?, ?, ?)',
+                    [(0, 'rapist', 15), (0, 'high income', 5), (0, 'colleague', 10),
+                     (1, 'neighbor', 7), (1, 'low income', 3), (1, 'Cousin', 20)])
+
+    features = victim.feature_matrix(con)
+    assert features.tolist() == [[1, 1, 10, 20], [0, 1, 10, -1], [1, 2, 11, 20], [0, 3, 12, 21], [1, 2, 11, -1]]
+
+    n = victim.NOT_ELIGIBLE
+    scores = victim.score_matrix(con, features, [(0, 0), (1, 4)])
+    assert scores.tolist() == [[n, 15, 10, 20, n],
+                               [n, 3, 27, n, n]]
+
+
+def test_select() -> None:
+    """Check that each killer gets the potential victim with the highest score not taken by a killer before."""
+    visits = victim.snapshot(np.array([(0, 9, 0, 100), (1, 9, 50, 60), (2, 9, 90, 200), (3, 9, 60, 60), (4, 9, 0, 100),
+                                       (4, 8, 100, 200), (5, 8, 150, 160), (6, 7, 0, 200), (2, 8, 200, 300)]))
+    n = victim.NOT_ELIGIBLE
+    scores = np.array([[n, 10, 20, 30, n, 5, 40],
+                       [n, 10, 20, 30, n, 5, 40]])
+
+    # Inhabitant 3 leaves at the minute they meet the killer, and inhabitant 6 never meets them.
+    assert victim.overlaps(visits, 0).tolist() == [[1, 9, 50, 60], [2, 9, 90, 100], [3, 9, 60, 60], [4, 9, 0, 100]]
+    ranking = victim.rank(victim.overlaps(visits, 0), scores[0], np.random.default_rng(0))
+    assert [(v[0], v[1], v[3]) for v in ranking] == [(2, 9, 20), (1, 9, 10)]
+    assert 90 <= ranking[0][2] < 100
+
+    # Both killers want inhabitant 2, who is killed by killer 0.
+    killers = [(0, 0), (1, 4)]
+    victims = victim.select(visits, killers, scores, np.random.default_rng(0))
+    assert [(v[0], v[1]) for v in victims] == [(2, 9), (1, 9)]
+    assert victim.select(visits, [(0, 6)], scores, np.random.default_rng(0)) == [None]
+
+    with concurrent.futures.ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn')) as executor:
+        assert victim.select(visits, killers, scores, np.random.default_rng(0), executor) == victims